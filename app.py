@@ -1,96 +1,144 @@
 from flask import Flask, request, jsonify
-import json
-from datetime import datetime
+import orjson
+import time
 import logging
 import sys
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
-# Configure logging to ensure output goes to stdout
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+# Configure logging to ensure output goes to stdout. Records are queued by the
+# request thread and written by a background listener so handlers never block
+# on the stream.
+_log_queue = queue.SimpleQueue()
+_stdout_handler = logging.StreamHandler(sys.stdout)
+_stdout_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%dT%H:%M:%S'))
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+_log_listener = QueueListener(_log_queue, _stdout_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 app = Flask(__name__)
 logger = logging.getLogger(__name__)
 
+# (epoch second, formatted date/time) for the most recent timestamp
+_timestamp_prefix = (None, '')
+
+def iso_timestamp():
+    """Local ISO-8601 timestamp with microseconds, formatting the date part once per second"""
+    global _timestamp_prefix
+    now = time.time()
+    second = int(now)
+    cached_second, prefix = _timestamp_prefix
+    if second != cached_second:
+        prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(second))
+        _timestamp_prefix = (second, prefix)
+    return f"{prefix}.{int((now - second) * 1_000_000):06d}"
+
+# Content types whose bodies are parsed into request.form
+FORM_MIMETYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+
+# CORS headers shared by regular responses and preflight replies
+_CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Headers', 'Content-Type,Authorization'),
+    ('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS'),
+)
+
+def preflight_middleware(wsgi_app):
+    """Answer CORS preflight (OPTIONS) requests before Flask builds a request or routes it"""
+    def middleware(environ, start_response):
+        if environ['REQUEST_METHOD'] == 'OPTIONS':
+            start_response('204 No Content', list(_CORS_HEADERS))
+            return [b'']
+        return wsgi_app(environ, start_response)
+    return middleware
+
+app.wsgi_app = preflight_middleware(app.wsgi_app)
+
 # Add CORS support
 @app.after_request
 def after_request(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.extend(_CORS_HEADERS)
     return response
 
-@app.route('/', methods=['GET'])
-def home():
-    logger.info("Home endpoint accessed")
-    return jsonify({
+# Static responses are serialized once at import
+_HOME_RESPONSE = (
+    orjson.dumps({
         "status": "running",
         "message": "Webhook listener is active",
         "endpoints": {
             "/webhook": "POST - Receive webhook data"
         }
-    })
+    }),
+    200,
+    {'Content-Type': 'application/json'}
+)
 
-@app.route('/webhook', methods=['POST', 'OPTIONS'])
+@app.route('/', methods=['GET'])
+def home():
+    logger.info("Home endpoint accessed")
+    return _HOME_RESPONSE
+
+@app.route('/webhook', methods=['POST'])
 def webhook():
-    # Handle CORS preflight
-    if request.method == 'OPTIONS':
-        logger.info("OPTIONS request received for /webhook")
-        return '', 200
     # Log timestamp
-    timestamp = datetime.now().isoformat()
-    
-    logger.info(f"POST request received at /webhook at {timestamp}")
-    
-    # Get request details
-    headers = dict(request.headers)
-    method = request.method
-    url = request.url
-    
-    # Log basic info immediately
-    logger.info(f"Method: {method}")
-    logger.info(f"URL: {url}")
-    logger.info(f"Content-Type: {request.content_type}")
-    logger.info(f"Content-Length: {request.content_length}")
+    timestamp = iso_timestamp()
     
-    # Get body data in different formats
-    raw_data = request.get_data(as_text=True)
-    
-    # Try to parse as JSON
-    json_data = None
-    try:
-        json_data = request.get_json()
-    except:
-        pass
-    
-    # Try to get form data
-    form_data = None
-    if request.form:
-        form_data = dict(request.form)
-    
-    # Log everything
-    log_data = {
-        "timestamp": timestamp,
-        "method": method,
-        "url": url,
-        "headers": headers,
-        "raw_body": raw_data,
-        "json_data": json_data,
-        "form_data": form_data,
-        "query_params": dict(request.args)
-    }
-    
-    # Log to console (will appear in Render logs)
-    logger.info("="*50)
-    logger.info(f"WEBHOOK RECEIVED at {timestamp}")
-    logger.info("="*50)
-    logger.info(json.dumps(log_data, indent=2))
-    logger.info("="*50)
-    
-    # Also use print with flush to ensure output
-    print(f"\nWEBHOOK DATA: {json.dumps(log_data, indent=2)}", flush=True)
+    # Log everything. The request details, body and header copy are only read,
+    # decoded and parsed for these records, so none of it is built when INFO
+    # is disabled.
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(f"POST request received at /webhook at {timestamp}")
+        
+        # Get request details
+        method = request.method
+        url = request.url
+        
+        # Log basic info immediately
+        logger.info(f"Method: {method}")
+        logger.info(f"URL: {url}")
+        logger.info(f"Content-Type: {request.content_type}")
+        logger.info(f"Content-Length: {request.content_length}")
+        
+        # Get body data in different formats
+        raw_data = request.get_data(as_text=True)
+        
+        # Try to parse as JSON
+        json_data = None
+        try:
+            json_data = request.get_json()
+        except:
+            pass
+        
+        # Only form-encoded bodies are parsed as forms; JSON webhooks never touch the form parser
+        form_data = None
+        if request.mimetype in FORM_MIMETYPES:
+            form_data = dict(request.form) or None
+        
+        log_data = {
+            "timestamp": timestamp,
+            "method": method,
+            "url": url,
+            "headers": dict(request.headers),
+            "raw_body": raw_data,
+            "json_data": json_data,
+            "form_data": form_data,
+            "query_params": dict(request.args)
+        }
+        
+        # Log to console as a single record (will appear in Render logs).
+        # Compact JSON in production; pretty-printed only when debugging locally.
+        if app.debug:
+            banner = "=" * 50
+            logger.info(
+                f"{banner}\nWEBHOOK RECEIVED at {timestamp}\n{banner}\n"
+                f"{orjson.dumps(log_data, option=orjson.OPT_INDENT_2).decode()}\n{banner}"
+            )
+        else:
+            logger.info("WEBHOOK RECEIVED at %s: %s", timestamp, orjson.dumps(log_data).decode())
     
     # Return success response
     return jsonify({
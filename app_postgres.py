@@ -5,21 +5,42 @@ Designed for persistent storage on Render's managed PostgreSQL
 """
 
 import os
-import json
+import atexit
+import orjson
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from flask import Flask, request, jsonify, send_file
+from contextlib import contextmanager
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from json_provider import OrjsonProvider
 from datetime import datetime
-from urllib.parse import urlparse
 import logging
-import tempfile
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+try:
+    import simdjson
+except ImportError:  # pysimdjson is optional; orjson handles every payload without it
+    simdjson = None
+
+# Configure logging. Records are queued by the request thread and written by a
+# background listener so handlers never block on the stream.
+_log_queue = queue.SimpleQueue()
+_stderr_handler = logging.StreamHandler()
+_stderr_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+_log_listener = QueueListener(_log_queue, _stderr_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for all routes
 
 # Database connection configuration
@@ -27,234 +48,565 @@ DATABASE_URL = os.environ.get('DATABASE_URL')
 if not DATABASE_URL:
     logger.warning("DATABASE_URL not set, some features may not work")
 
-def get_db_connection():
-    """Create a new database connection using connection pooling best practices"""
-    if not DATABASE_URL:
-        raise ValueError("DATABASE_URL environment variable is required")
-    
-    # Parse the database URL
-    parsed = urlparse(DATABASE_URL)
+# Connection pool sizing (one pool per Gunicorn worker process). psycopg2's
+# pool only keeps PG_POOL_MIN idle connections: any returned while that many
+# are already idle are closed, so concurrency above PG_POOL_MIN reconnects
+# (and re-PREPAREs) per checkout. PG_POOL_MIN connections are opened up front,
+# so the default matches the Dockerfile's 4 threads per worker and stays small
+# enough for low connection limits; raise it where workers see more concurrency.
+PG_POOL_MIN = int(os.environ.get('PG_POOL_MIN', 4))
+PG_POOL_MAX = max(int(os.environ.get('PG_POOL_MAX', 16)), PG_POOL_MIN)
+# Connections idle in the pool longer than this (seconds) are reopened at
+# checkout, so they are replaced before PgBouncer / the provider drops idle
+# sessions server-side. Busy connections are never recycled.
+PG_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 300))
+_pool = None
+_pool_lock = threading.Lock()
+
+# Rows fetched per round-trip, and written per response chunk, when streaming /export
+EXPORT_FETCH_SIZE = 1000
+
+# Bodies above this size are parsed with simdjson; smaller ones are faster with orjson
+SIMDJSON_MIN_BYTES = 32 * 1024
+
+# simdjson parsers are not thread-safe, so each worker thread keeps its own
+_parser_local = threading.local()
+
+def parse_json_body(raw_body):
+    """Decode a JSON request body, using simdjson only for large payloads"""
+    if simdjson is not None and len(raw_body) > SIMDJSON_MIN_BYTES:
+        parser = getattr(_parser_local, 'parser', None)
+        if parser is None:
+            parser = _parser_local.parser = simdjson.Parser()
+        try:
+            return parser.parse(raw_body, recursive=True)
+        except (ValueError, RuntimeError):
+            # Fall back to orjson for anything simdjson rejects. pysimdjson 5.x
+            # raises ValueError for every parse error; 6.x+ raises RuntimeError
+            # for some valid JSON orjson accepts (e.g. integers wider than 64 bits).
+            pass
+    return orjson.loads(raw_body)
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if not DATABASE_URL:
+                    raise ValueError("DATABASE_URL environment variable is required")
+                _pool = ThreadedConnectionPool(
+                    minconn=PG_POOL_MIN,
+                    maxconn=PG_POOL_MAX,
+                    dsn=DATABASE_URL,
+                    connect_timeout=10,
+                    options='-c statement_timeout=30000',  # 30 second statement timeout
+                    application_name='webhook-listener',
+                    # Detect half-open connections behind NAT within ~1 minute
+                    keepalives=1,
+                    keepalives_idle=30,
+                    keepalives_interval=10,
+                    keepalives_count=3,
+                    connection_factory=WebhookConnection
+                )
+                atexit.register(_pool.closeall)
+                logger.info(f"Database connection pool initialized (max {PG_POOL_MAX} connections)")
+    return _pool
+
+@contextmanager
+def db(autocommit=False):
+    """Check out a pooled connection; commit on success, roll back on error.
     
+    With autocommit=True each statement commits by itself, which saves the
+    separate BEGIN and COMMIT round-trips for single-statement work.
+    """
+    pool = get_pool()
     try:
-        conn = psycopg2.connect(
-            host=parsed.hostname,
-            database=parsed.path[1:],  # Remove leading slash
-            user=parsed.username,
-            password=parsed.password,
-            port=parsed.port or 5432,
-            # Connection pooling settings
-            connect_timeout=10,
-            options='-c statement_timeout=30000'  # 30 second statement timeout
-        )
-        return conn
+        conn = pool.getconn()
+        while conn.closed or time.monotonic() - conn.idle_since > PG_POOL_RECYCLE:
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         raise
+    discard = False
+    if autocommit:
+        conn.autocommit = True
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            discard = True  # Connection is broken; don't hand it out again
+        raise
+    finally:
+        if autocommit and not conn.closed:
+            conn.autocommit = False
+        conn.idle_since = time.monotonic()
+        pool.putconn(conn, close=discard or bool(conn.closed))
+
+# Webhook SQL. Each upsert variant writes the contact and its processed
+# webhook log in a single statement (one round-trip per webhook).
+_PROCESSED_LOG_CTE = """    log AS (
+        INSERT INTO webhook_logs
+        (event_type, contact_email, contact_name, linkedin_url, webhook_data,
+         processed, contact_id, processing_notes)
+        SELECT %(event_type)s, %(log_email)s, %(name)s, %(log_linkedin_url)s, %(payload)s,
+               TRUE, up.id,
+               'Contact ' || CASE WHEN up.inserted THEN 'created' ELSE 'updated' END
+               || ' with ID ' || up.id || %(matched_note)s
+        FROM up
+        RETURNING log_id
+    )
+    SELECT log.log_id, up.id, up.inserted FROM log, up
+"""
+
+WEBHOOK_UPSERT_BY_EMAIL_SQL = """
+    WITH up AS (
+        INSERT INTO linkedin_contacts 
+        (name, title, company, location, email, linkedin_url, website, profile_data, raw_json)
+        VALUES (%(name)s, %(title)s, %(company)s, %(location)s, %(email)s, %(linkedin_url)s,
+                %(website)s, %(profile_data)s, %(payload)s)
+        ON CONFLICT (email) DO UPDATE SET
+            name = EXCLUDED.name,
+            title = EXCLUDED.title,
+            company = EXCLUDED.company,
+            location = EXCLUDED.location,
+            linkedin_url = EXCLUDED.linkedin_url,
+            website = EXCLUDED.website,
+            profile_data = EXCLUDED.profile_data,
+            raw_json = EXCLUDED.raw_json,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING id, (xmax = 0) AS inserted
+    ),
+""" + _PROCESSED_LOG_CTE
+
+WEBHOOK_UPSERT_BY_LINKEDIN_URL_SQL = """
+    WITH up AS (
+        INSERT INTO linkedin_contacts 
+        (name, title, company, location, linkedin_url, website, profile_data, raw_json)
+        VALUES (%(name)s, %(title)s, %(company)s, %(location)s, %(linkedin_url)s,
+                %(website)s, %(profile_data)s, %(payload)s)
+        ON CONFLICT (linkedin_url) DO UPDATE SET
+            name = EXCLUDED.name,
+            title = EXCLUDED.title,
+            company = EXCLUDED.company,
+            location = EXCLUDED.location,
+            website = EXCLUDED.website,
+            profile_data = EXCLUDED.profile_data,
+            raw_json = EXCLUDED.raw_json,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING id, (xmax = 0) AS inserted
+    ),
+""" + _PROCESSED_LOG_CTE
+
+WEBHOOK_INSERT_UNMATCHED_SQL = """
+    WITH up AS (
+        INSERT INTO linkedin_contacts 
+        (name, title, company, location, website, profile_data, raw_json)
+        VALUES (%(name)s, %(title)s, %(company)s, %(location)s,
+                %(website)s, %(profile_data)s, %(payload)s)
+        RETURNING id, TRUE AS inserted
+    ),
+""" + _PROCESSED_LOG_CTE
+
+# Webhook logs that don't produce a contact are inserted in batches by a
+# background thread instead of one round-trip per request
+WEBHOOK_LOG_BATCH_SQL = """
+    INSERT INTO webhook_logs (event_type, contact_email, contact_name, linkedin_url, webhook_data)
+    VALUES %s
+"""
+LOG_BATCH_SIZE = 500
+LOG_BATCH_INTERVAL = 0.05  # seconds to wait for a batch to fill
+_log_rows = queue.Queue(maxsize=10_000)
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+def write_webhook_logs(rows):
+    """Insert webhook log rows with a single multi-row INSERT"""
+    with db() as conn, conn.cursor() as cursor:
+        execute_values(cursor, WEBHOOK_LOG_BATCH_SQL, rows, page_size=LOG_BATCH_SIZE)
+
+def _next_log_batch(block=True):
+    """Collect up to LOG_BATCH_SIZE queued rows, waiting at most LOG_BATCH_INTERVAL after the first"""
+    try:
+        rows = [_log_rows.get(block=block)]
+    except queue.Empty:
+        return []
+    deadline = time.monotonic() + LOG_BATCH_INTERVAL
+    while len(rows) < LOG_BATCH_SIZE:
+        try:
+            if block:
+                rows.append(_log_rows.get(timeout=max(deadline - time.monotonic(), 0)))
+            else:
+                rows.append(_log_rows.get_nowait())
+        except queue.Empty:
+            break
+    return rows
+
+def _flush_log_batch(rows):
+    try:
+        write_webhook_logs(rows)
+    except Exception as e:
+        logger.error(f"Failed to write {len(rows)} webhook logs: {e}")
+
+def _run_log_writer():
+    """Background loop that drains the webhook log queue"""
+    while True:
+        _flush_log_batch(_next_log_batch())
+
+def _drain_log_queue():
+    """Write whatever is still queued when the worker exits"""
+    while True:
+        rows = _next_log_batch(block=False)
+        if not rows:
+            return
+        _flush_log_batch(rows)
+
+def enqueue_webhook_log(row):
+    """Queue a webhook log row, starting this process's writer thread on first use"""
+    global _log_writer
+    if _log_writer is None:
+        with _log_writer_lock:
+            if _log_writer is None:
+                get_pool()  # so the pool is closed after the exit-time drain below
+                atexit.register(_drain_log_queue)
+                _log_writer = threading.Thread(target=_run_log_writer, name='webhook-log-writer', daemon=True)
+                _log_writer.start()
+    try:
+        _log_rows.put_nowait(row)
+    except queue.Full:
+        # Writer is falling behind; write this row inline rather than dropping it
+        write_webhook_logs([row])
+
+# Prepared statement names for the webhook SQL above, and the parameter order
+# (with types) used when preparing them server-side
+# Server-side prepared statements live on a Postgres backend connection, which
+# PgBouncer in transaction pooling mode does not pin to one client connection.
+# Set PG_PREPARED_STATEMENTS=0 there to send the plain SQL instead.
+PG_PREPARED_STATEMENTS = os.environ.get('PG_PREPARED_STATEMENTS', '1') != '0'
+
+WEBHOOK_STATEMENTS = {
+    'wh_upsert_by_email': WEBHOOK_UPSERT_BY_EMAIL_SQL,
+    'wh_upsert_by_linkedin_url': WEBHOOK_UPSERT_BY_LINKEDIN_URL_SQL,
+    'wh_insert_unmatched': WEBHOOK_INSERT_UNMATCHED_SQL,
+}
+_WEBHOOK_PARAM_TYPES = (
+    ('event_type', 'text'),
+    ('name', 'text'),
+    ('title', 'text'),
+    ('company', 'text'),
+    ('location', 'text'),
+    ('email', 'text'),
+    ('linkedin_url', 'text'),
+    ('log_email', 'text'),
+    ('log_linkedin_url', 'text'),
+    ('website', 'text'),
+    ('profile_data', 'text'),
+    ('payload', 'jsonb'),
+    ('matched_note', 'text'),
+)
+
+def _prepare_sql(name, sql):
+    """Rewrite a named-parameter statement as a PREPARE with positional parameters"""
+    for position, (param, _) in enumerate(_WEBHOOK_PARAM_TYPES, start=1):
+        sql = sql.replace(f'%({param})s', f'${position}')
+    types = ', '.join(param_type for _, param_type in _WEBHOOK_PARAM_TYPES)
+    return f"PREPARE {name} ({types}) AS {sql}"
+
+# PREPARE and EXECUTE strings are built once at import rather than per connection/request
+_PREPARE_WEBHOOK_SQL = tuple(_prepare_sql(name, sql) for name, sql in WEBHOOK_STATEMENTS.items())
+_EXECUTE_ARGS = ', '.join(f'%({name})s' for name, _ in _WEBHOOK_PARAM_TYPES)
+_EXECUTE_WEBHOOK_SQL = {name: f"EXECUTE {name} ({_EXECUTE_ARGS})" for name in WEBHOOK_STATEMENTS}
+
+class WebhookConnection(psycopg2.extensions.connection):
+    """Pooled connection that remembers when it went idle and whether the webhook statements are prepared"""
+    webhook_prepared = False
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Stamped again by db() each time the connection is returned to the pool
+        self.idle_since = time.monotonic()
+
+def prepare_webhook_statements(conn):
+    """PREPARE the webhook statements once per connection so Postgres skips parse/plan"""
+    if conn.webhook_prepared or not PG_PREPARED_STATEMENTS:
+        return
+    try:
+        with conn.cursor() as cursor:
+            for prepare_sql in _PREPARE_WEBHOOK_SQL:
+                cursor.execute(prepare_sql)
+        conn.commit()
+    except Exception:
+        # PREPARE isn't transactional: statements prepared before the failure
+        # survive the rollback, and the next checkout's PREPARE would fail with
+        # "already exists". Drop them, or close the connection so db() discards it.
+        try:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute("DEALLOCATE ALL")
+            conn.commit()
+        except psycopg2.Error:
+            conn.close()
+        raise
+    conn.webhook_prepared = True
+
+def _webhook_sql(name):
+    """SQL for a webhook statement: EXECUTE when prepared statements are enabled"""
+    return _EXECUTE_WEBHOOK_SQL[name] if PG_PREPARED_STATEMENTS else WEBHOOK_STATEMENTS[name]
+
+def execute_prepared(cursor, name, params):
+    """Run a webhook statement by name, as EXECUTE when prepared statements are enabled"""
+    cursor.execute(_webhook_sql(name), params)
+
+def execute_prepared_batch(cursor, statements, page_size=100):
+    """Run (name, params) webhook statements in order, page_size statements per round-trip.
+    
+    Like psycopg2.extras.execute_batch, but each statement may be a different
+    prepared variant. Their results are discarded.
+    """
+    for start in range(0, len(statements), page_size):
+        page = statements[start:start + page_size]
+        cursor.execute(b';'.join(cursor.mogrify(_webhook_sql(name), params) for name, params in page))
+
+# Advisory lock serializing init_database() across gunicorn workers
+INIT_LOCK_ID = 42
+
+TABLES_EXIST_SQL = """
+    SELECT EXISTS (
+        SELECT FROM information_schema.tables 
+        WHERE table_schema = 'public' 
+        AND table_name = 'linkedin_contacts'
+    )
+"""
+
+# Schema and migrations, sent as one multi-statement script. Every statement is
+# idempotent, so it runs on each startup.
+SCHEMA_SQL = """
+    -- Create linkedin_contacts table with proper indexes
+    CREATE TABLE IF NOT EXISTS linkedin_contacts (
+        id SERIAL PRIMARY KEY,
+        name TEXT,
+        title TEXT,
+        company TEXT,
+        location TEXT,
+        email TEXT,
+        linkedin_url TEXT,
+        website TEXT,
+        profile_data TEXT,
+        raw_json JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    -- Unique constraints must be non-deferrable for ON CONFLICT. Older deployments
+    -- created them DEFERRABLE; only those are dropped and recreated, so the
+    -- unique indexes aren't rebuilt on every startup.
+    DO $$ 
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_constraint
+                   WHERE conrelid = 'linkedin_contacts'::regclass
+                   AND conname = 'unique_email' AND condeferrable) THEN
+            ALTER TABLE linkedin_contacts DROP CONSTRAINT unique_email;
+        END IF;
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                       WHERE conrelid = 'linkedin_contacts'::regclass
+                       AND conname = 'unique_email') THEN
+            ALTER TABLE linkedin_contacts ADD CONSTRAINT unique_email UNIQUE(email);
+            RAISE NOTICE 'Created unique_email constraint';
+        END IF;
+        
+        IF EXISTS (SELECT 1 FROM pg_constraint
+                   WHERE conrelid = 'linkedin_contacts'::regclass
+                   AND conname = 'unique_linkedin_url' AND condeferrable) THEN
+            ALTER TABLE linkedin_contacts DROP CONSTRAINT unique_linkedin_url;
+        END IF;
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                       WHERE conrelid = 'linkedin_contacts'::regclass
+                       AND conname = 'unique_linkedin_url') THEN
+            ALTER TABLE linkedin_contacts ADD CONSTRAINT unique_linkedin_url UNIQUE(linkedin_url);
+            RAISE NOTICE 'Created unique_linkedin_url constraint';
+        END IF;
+    END $$;
+    
+    -- Create indexes for better query performance
+    CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_email 
+    ON linkedin_contacts(email) WHERE email IS NOT NULL AND email != '';
+    
+    CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_linkedin_url
+    ON linkedin_contacts(linkedin_url) WHERE linkedin_url IS NOT NULL AND linkedin_url != '';
+    
+    CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_company 
+    ON linkedin_contacts(company);
+    
+    CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_created 
+    ON linkedin_contacts(created_at DESC);
+    
+    -- Create webhook_logs table for tracking all webhook activity
+    CREATE TABLE IF NOT EXISTS webhook_logs (
+        log_id SERIAL PRIMARY KEY,
+        event_type TEXT,
+        contact_email TEXT,
+        contact_id INTEGER,
+        webhook_data JSONB,
+        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        processed BOOLEAN DEFAULT FALSE,
+        processing_notes TEXT
+    );
+    
+    -- webhook_logs migrations (columns added after the first deployments)
+    ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS contact_name TEXT;
+    ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS linkedin_url TEXT;
+    ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS processing_notes TEXT;
+    ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS processed BOOLEAN DEFAULT FALSE;
+    
+    -- Convert contact_id to INTEGER if it's still VARCHAR
+    DO $$ 
+    BEGIN
+        IF EXISTS (SELECT 1 FROM information_schema.columns 
+                  WHERE table_name='webhook_logs' AND column_name='contact_id' 
+                  AND data_type='character varying') THEN
+            ALTER TABLE webhook_logs ALTER COLUMN contact_id TYPE INTEGER USING 
+                CASE WHEN contact_id ~ '^[0-9]+$' THEN contact_id::INTEGER ELSE NULL END;
+            RAISE NOTICE 'Converted contact_id to INTEGER';
+        END IF;
+    END $$;
+    
+    -- Convert VARCHAR(n) columns from older deployments to TEXT. This needs no
+    -- table rewrite, but the company counts view depends on company, so it is
+    -- dropped here and recreated below.
+    DO $$ 
+    BEGIN
+        IF EXISTS (SELECT 1 FROM information_schema.columns 
+                  WHERE table_schema = 'public'
+                  AND table_name IN ('linkedin_contacts', 'webhook_logs')
+                  AND column_name != 'contact_id'
+                  AND data_type = 'character varying') THEN
+            DROP MATERIALIZED VIEW IF EXISTS contact_company_counts;
+            ALTER TABLE linkedin_contacts
+                ALTER COLUMN name TYPE TEXT,
+                ALTER COLUMN title TYPE TEXT,
+                ALTER COLUMN company TYPE TEXT,
+                ALTER COLUMN location TYPE TEXT,
+                ALTER COLUMN email TYPE TEXT,
+                ALTER COLUMN linkedin_url TYPE TEXT,
+                ALTER COLUMN website TYPE TEXT;
+            ALTER TABLE webhook_logs
+                ALTER COLUMN event_type TYPE TEXT,
+                ALTER COLUMN contact_email TYPE TEXT,
+                ALTER COLUMN contact_name TYPE TEXT,
+                ALTER COLUMN linkedin_url TYPE TEXT;
+            RAISE NOTICE 'Converted VARCHAR columns to TEXT';
+        END IF;
+    END $$;
+    
+    -- Create index for webhook logs
+    CREATE INDEX IF NOT EXISTS idx_webhook_logs_received 
+    ON webhook_logs(received_at DESC);
+    
+    -- Unprocessed logs (webhooks that produced no contact) are a small fraction
+    -- of the table, so a partial index keeps tailing them cheap
+    CREATE INDEX IF NOT EXISTS idx_webhook_logs_unprocessed
+    ON webhook_logs(received_at DESC) WHERE processed = FALSE;
+    
+    -- GIN indexes for JSONB containment (@>) lookups
+    CREATE INDEX IF NOT EXISTS idx_contacts_raw_json_gin
+    ON linkedin_contacts USING GIN (raw_json jsonb_path_ops);
+    
+    CREATE INDEX IF NOT EXISTS idx_webhook_data_gin
+    ON webhook_logs USING GIN (webhook_data jsonb_path_ops);
+    
+    -- Company distribution for /stats, refreshed in the background.
+    -- The unique index is required for REFRESH ... CONCURRENTLY.
+    CREATE MATERIALIZED VIEW IF NOT EXISTS contact_company_counts AS
+    SELECT company, COUNT(*) as count
+    FROM linkedin_contacts
+    WHERE company IS NOT NULL AND company != ''
+    GROUP BY company;
+    
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_contact_company_counts_company
+    ON contact_company_counts(company);
+    
+    -- Create a function to update the updated_at timestamp
+    CREATE OR REPLACE FUNCTION update_updated_at_column()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.updated_at = CURRENT_TIMESTAMP;
+        RETURN NEW;
+    END;
+    $$ language 'plpgsql';
+    
+    -- Create trigger for auto-updating updated_at
+    DROP TRIGGER IF EXISTS update_linkedin_contacts_updated_at ON linkedin_contacts;
+    CREATE TRIGGER update_linkedin_contacts_updated_at 
+    BEFORE UPDATE ON linkedin_contacts 
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+"""
 
 def init_database():
     """Initialize database tables if they don't exist"""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if tables already exist before trying to create
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'linkedin_contacts'
-            )
-        """)
-        
-        tables_exist = cursor.fetchone()[0]
-        if tables_exist:
-            logger.info("Database tables already exist - running migrations")
-        else:
-            logger.info("Creating new database tables")
-        
-        # Create linkedin_contacts table with proper indexes
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS linkedin_contacts (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255),
-                title VARCHAR(500),
-                company VARCHAR(255),
-                location VARCHAR(255),
-                email VARCHAR(255),
-                linkedin_url VARCHAR(500),
-                website VARCHAR(500),
-                profile_data TEXT,
-                raw_json JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Drop and recreate constraints as non-deferrable (for existing deployments)
-        # Note: Using regular UNIQUE constraints (not deferrable) for ON CONFLICT compatibility
-        try:
-            logger.info("Dropping existing deferrable constraints if they exist...")
-            cursor.execute("ALTER TABLE linkedin_contacts DROP CONSTRAINT IF EXISTS unique_email")
-            cursor.execute("ALTER TABLE linkedin_contacts DROP CONSTRAINT IF EXISTS unique_linkedin_url")
+        with db() as conn, conn.cursor() as cursor:
+            # The lock is held until this transaction commits. A worker that finds
+            # it taken waits for the holder to finish rather than re-running the DDL.
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (INIT_LOCK_ID,))
+            waited = not cursor.fetchone()[0]
+            if waited:
+                logger.info("Another worker is initializing the database - waiting for it")
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (INIT_LOCK_ID,))
             
-            logger.info("Creating non-deferrable unique constraints...")
-            cursor.execute("""
-                DO $$ 
-                BEGIN
-                    BEGIN
-                        ALTER TABLE linkedin_contacts ADD CONSTRAINT unique_email UNIQUE(email);
-                        RAISE NOTICE 'Created unique_email constraint';
-                    EXCEPTION 
-                        WHEN duplicate_table THEN 
-                            RAISE NOTICE 'unique_email constraint already exists';
-                    END;
-                    
-                    BEGIN
-                        ALTER TABLE linkedin_contacts ADD CONSTRAINT unique_linkedin_url UNIQUE(linkedin_url);
-                        RAISE NOTICE 'Created unique_linkedin_url constraint';
-                    EXCEPTION 
-                        WHEN duplicate_table THEN 
-                            RAISE NOTICE 'unique_linkedin_url constraint already exists';
-                    END;
-                END $$;
-            """)
-            logger.info("Constraint recreation completed")
-        except Exception as constraint_error:
-            logger.error(f"Constraint recreation error: {constraint_error}")
-            # Continue - constraints may already exist or conflict
-        
-        # Create indexes for better query performance
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_email 
-            ON linkedin_contacts(email) WHERE email IS NOT NULL AND email != ''
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_linkedin_url
-            ON linkedin_contacts(linkedin_url) WHERE linkedin_url IS NOT NULL AND linkedin_url != ''
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_company 
-            ON linkedin_contacts(company)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_created 
-            ON linkedin_contacts(created_at DESC)
-        """)
-        
-        # Create webhook_logs table for tracking all webhook activity
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS webhook_logs (
-                log_id SERIAL PRIMARY KEY,
-                event_type VARCHAR(100),
-                contact_email VARCHAR(255),
-                contact_id VARCHAR(100),
-                webhook_data JSONB,
-                received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                processed BOOLEAN DEFAULT FALSE,
-                processing_notes TEXT
-            )
-        """)
-        
-        # Always run migrations for webhook_logs table (even if tables exist)
-        logger.info("Running webhook_logs table migrations...")
-        try:
-            cursor.execute("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS contact_name VARCHAR(255)")
-            logger.info("Added contact_name column")
-            cursor.execute("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS linkedin_url VARCHAR(500)")
-            logger.info("Added linkedin_url column")
-            cursor.execute("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS processing_notes TEXT")
-            logger.info("Added processing_notes column")
-            cursor.execute("ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS processed BOOLEAN DEFAULT FALSE")
-            logger.info("Added processed column")
+            # Check if tables already exist before trying to create
+            cursor.execute(TABLES_EXIST_SQL)
             
-            # Try to convert contact_id to INTEGER if it's still VARCHAR
-            cursor.execute("""
-                DO $$ 
-                BEGIN
-                    IF EXISTS (SELECT 1 FROM information_schema.columns 
-                              WHERE table_name='webhook_logs' AND column_name='contact_id' 
-                              AND data_type='character varying') THEN
-                        ALTER TABLE webhook_logs ALTER COLUMN contact_id TYPE INTEGER USING 
-                            CASE WHEN contact_id ~ '^[0-9]+$' THEN contact_id::INTEGER ELSE NULL END;
-                        RAISE NOTICE 'Converted contact_id to INTEGER';
-                    END IF;
-                END $$;
-            """)
-            logger.info("Checked contact_id type conversion")
-        except Exception as alter_error:
-            logger.error(f"Schema alteration error: {alter_error}")
-            # Continue - may be type conversion issues on existing data
-        
-        # Create index for webhook logs
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_webhook_logs_received 
-            ON webhook_logs(received_at DESC)
-        """)
-        
-        # Create a function to update the updated_at timestamp
-        cursor.execute("""
-            CREATE OR REPLACE FUNCTION update_updated_at_column()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                NEW.updated_at = CURRENT_TIMESTAMP;
-                RETURN NEW;
-            END;
-            $$ language 'plpgsql';
-        """)
-        
-        # Create trigger for auto-updating updated_at
-        cursor.execute("""
-            DROP TRIGGER IF EXISTS update_linkedin_contacts_updated_at ON linkedin_contacts;
-            CREATE TRIGGER update_linkedin_contacts_updated_at 
-            BEFORE UPDATE ON linkedin_contacts 
-            FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
-        """)
+            tables_exist = cursor.fetchone()[0]
+            if tables_exist and waited:
+                logger.info("Database tables initialized by another worker")
+                return
+            if tables_exist:
+                logger.info("Database tables already exist - running migrations")
+            else:
+                logger.info("Creating new database tables")
+            
+            # The whole schema and its migrations go over in one round-trip
+            cursor.execute(SCHEMA_SQL)
         
-        conn.commit()
         logger.info("Database tables initialized successfully")
         
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+# Contact count and recent webhook count in one round-trip. The contact count
+# is the planner's estimate (kept fresh by autovacuum), so it doesn't scan the
+# table; ?exact=1 runs the COUNT(*) instead. reltuples is -1 before the first
+# ANALYZE.
+HEALTH_COUNTS_SQL = """
+    SELECT
+        (SELECT GREATEST(reltuples, 0)::bigint FROM pg_class
+         WHERE oid = 'linkedin_contacts'::regclass),
+        (SELECT COUNT(*) FROM webhook_logs 
+         WHERE received_at > CURRENT_TIMESTAMP - INTERVAL '24 hours')
+"""
+HEALTH_EXACT_COUNTS_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM linkedin_contacts),
+        (SELECT COUNT(*) FROM webhook_logs 
+         WHERE received_at > CURRENT_TIMESTAMP - INTERVAL '24 hours')
+"""
 
 @app.route('/')
 def index():
     """Health check and status endpoint"""
-    try:
-        # First try to initialize database if needed
-        init_database()
-    except Exception as e:
-        logger.warning(f"Database initialization during health check: {e}")
+    # No-op once startup initialization has succeeded; retries it otherwise
+    ensure_db_initialized()
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get contact count
-        cursor.execute("SELECT COUNT(*) FROM linkedin_contacts")
-        contact_count = cursor.fetchone()[0]
-        
-        # Get recent webhook count
-        cursor.execute("""
-            SELECT COUNT(*) FROM webhook_logs 
-            WHERE received_at > CURRENT_TIMESTAMP - INTERVAL '24 hours'
-        """)
-        recent_webhooks = cursor.fetchone()[0]
-        
-        cursor.close()
-        conn.close()
+        with db() as conn, conn.cursor() as cursor:
+            exact = request.args.get('exact') == '1'
+            cursor.execute(HEALTH_EXACT_COUNTS_SQL if exact else HEALTH_COUNTS_SQL)
+            contact_count, recent_webhooks = cursor.fetchone()
         
         return jsonify({
             'status': 'healthy',
@@ -274,160 +626,95 @@ def index():
             'error_detail': str(e)
         }), 503
 
+def webhook_params(data, payload):
+    """Statement parameters for one webhook payload; payload is its JSON text"""
+    # Extract contact information from new data structure
+    name = data.get('name', '')
+    contact_info = data.get('contactInfo', {})
+    email = contact_info.get('email', '') if contact_info else ''
+    linkedin_url = contact_info.get('linkedinUrl', '') if contact_info else data.get('profileUrl', '')
+    
+    # Extract websites
+    websites = contact_info.get('websites', []) if contact_info else []
+    website = websites[0]['url'] if websites else ''
+    
+    return {
+        'event_type': 'linkedin_data',
+        'name': name,
+        'title': data.get('title', ''),
+        'company': data.get('company', ''),
+        'location': data.get('location', ''),
+        'email': email,
+        'linkedin_url': linkedin_url,
+        'log_email': email,
+        'log_linkedin_url': linkedin_url,
+        'website': website,
+        'profile_data': data.get('profile_data', ''),
+        'payload': payload,
+        'matched_note': f" (matched by {'email' if email else 'LinkedIn URL'})"
+    }
+
+def webhook_statement(params):
+    """Pick the upsert variant for a webhook, stripping the identifier it matches on"""
+    # Smart upsert: handle NULL/empty values properly for unique constraints
+    email = params['email']
+    linkedin_url = params['linkedin_url']
+    if email and email.strip():
+        params['email'] = email.strip()
+        return 'wh_upsert_by_email'
+    if linkedin_url and linkedin_url.strip():
+        params['linkedin_url'] = linkedin_url.strip()
+        return 'wh_upsert_by_linkedin_url'
+    return 'wh_insert_unmatched'
+
+def skipped_log_row(params):
+    """webhook_logs row for a webhook with no email or LinkedIn URL"""
+    return (params['event_type'], params['email'], params['name'], params['linkedin_url'], params['payload'])
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Main webhook endpoint for receiving LinkedIn data"""
     try:
-        data = request.get_json()
-        logger.info(f"Received webhook data: {data}")
+        # Parse the raw body directly instead of going through Flask's stdlib decoder
+        raw_body = request.get_data(cache=False)
+        data = parse_json_body(raw_body) if raw_body else None
+        logger.debug("Received webhook data: %s", data)
         
         if not data:
             logger.error("No JSON data provided in webhook request")
             return jsonify({'error': 'No data provided'}), 400
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Log the webhook event (extract details for logging)
-        contact_info = data.get('contactInfo', {})
-        log_email = contact_info.get('email', '') if contact_info else ''
-        log_name = data.get('name', '')
-        log_linkedin = contact_info.get('linkedinUrl', '') if contact_info else data.get('profileUrl', '')
+        # Store the request body as received; it was just validated by the parser
+        params = webhook_params(data, raw_body.decode())
+        name = params['name']
+        email = params['email']
+        linkedin_url = params['linkedin_url']
         
-        cursor.execute("""
-            INSERT INTO webhook_logs (event_type, contact_email, contact_name, linkedin_url, webhook_data)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING log_id
-        """, (
-            'linkedin_data',
-            log_email,
-            log_name,
-            log_linkedin,
-            json.dumps(data)
-        ))
-        log_id = cursor.fetchone()[0]
-        logger.info(f"Created webhook log with ID: {log_id}")
-        
-        # Extract contact information from new data structure
-        name = data.get('name', '')
-        contact_info = data.get('contactInfo', {})
-        email = contact_info.get('email', '') if contact_info else ''
-        linkedin_url = contact_info.get('linkedinUrl', '') if contact_info else data.get('profileUrl', '')
-        
-        # Extract websites
-        websites = contact_info.get('websites', []) if contact_info else []
-        website = websites[0]['url'] if websites else ''
-        
-        logger.info(f"Processing contact - Name: {name}, Email: {email}, LinkedIn: {linkedin_url}")
+        logger.info("Processing contact - Name: %s, Email: %s, LinkedIn: %s", name, email, linkedin_url)
         
         # Use email if available, otherwise use LinkedIn URL as unique identifier
         unique_identifier = email if email else linkedin_url
         
         if not unique_identifier:
-            conn.commit()
+            # Nothing to upsert, so the log row is queued and written in a background batch
+            enqueue_webhook_log(skipped_log_row(params))
             logger.warning(f"Skipping contact - no email or LinkedIn URL. Data keys: {list(data.keys())}")
             return jsonify({
                 'status': 'skipped',
                 'message': 'No email or LinkedIn URL provided',
-                'log_id': log_id,
                 'data_keys': list(data.keys())
-            }), 200
-        
-        # Smart upsert: handle NULL/empty values properly for unique constraints
-        if email and email.strip():
-            # Try to find existing record by email first
-            cursor.execute("""
-                INSERT INTO linkedin_contacts 
-                (name, title, company, location, email, linkedin_url, website, profile_data, raw_json)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (email) DO UPDATE SET
-                    name = EXCLUDED.name,
-                    title = EXCLUDED.title,
-                    company = EXCLUDED.company,
-                    location = EXCLUDED.location,
-                    linkedin_url = EXCLUDED.linkedin_url,
-                    website = EXCLUDED.website,
-                    profile_data = EXCLUDED.profile_data,
-                    raw_json = EXCLUDED.raw_json,
-                    updated_at = CURRENT_TIMESTAMP
-                RETURNING id, (xmax = 0) AS inserted
-            """, (
-                name,
-                data.get('title', ''),
-                data.get('company', ''),
-                data.get('location', ''),
-                email.strip(),
-                linkedin_url,
-                website,
-                data.get('profile_data', ''),
-                json.dumps(data)
-            ))
-        elif linkedin_url and linkedin_url.strip():
-            # No valid email, use LinkedIn URL for matching
-            cursor.execute("""
-                INSERT INTO linkedin_contacts 
-                (name, title, company, location, linkedin_url, website, profile_data, raw_json)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (linkedin_url) DO UPDATE SET
-                    name = EXCLUDED.name,
-                    title = EXCLUDED.title,
-                    company = EXCLUDED.company,
-                    location = EXCLUDED.location,
-                    website = EXCLUDED.website,
-                    profile_data = EXCLUDED.profile_data,
-                    raw_json = EXCLUDED.raw_json,
-                    updated_at = CURRENT_TIMESTAMP
-                RETURNING id, (xmax = 0) AS inserted
-            """, (
-                name,
-                data.get('title', ''),
-                data.get('company', ''),
-                data.get('location', ''),
-                linkedin_url.strip(),
-                website,
-                data.get('profile_data', ''),
-                json.dumps(data)
-            ))
-        else:
-            # Neither email nor LinkedIn URL - insert without unique constraint matching
-            cursor.execute("""
-                INSERT INTO linkedin_contacts 
-                (name, title, company, location, website, profile_data, raw_json)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                RETURNING id, TRUE AS inserted
-            """, (
-                name,
-                data.get('title', ''),
-                data.get('company', ''),
-                data.get('location', ''),
-                website,
-                data.get('profile_data', ''),
-                json.dumps(data)
-            ))
+            }), 202
         
-        result = cursor.fetchone()
-        contact_id = result[0]
-        was_inserted = result[1]
-        logger.info(f"Database operation completed - Contact ID: {contact_id}, Inserted: {was_inserted}")
-        
-        # Mark webhook as processed with contact_id
-        cursor.execute("""
-            UPDATE webhook_logs 
-            SET processed = TRUE, 
-                contact_id = %s,
-                processing_notes = %s
-            WHERE log_id = %s
-        """, (
-            contact_id,
-            f"Contact {'created' if was_inserted else 'updated'} with ID {contact_id} (matched by {'email' if email else 'LinkedIn URL'})",
-            log_id
-        ))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # The upsert and the processed webhook log are a single statement, so it
+        # runs in autocommit: one round-trip with no BEGIN/COMMIT around it
+        with db(autocommit=True) as conn, conn.cursor() as cursor:
+            prepare_webhook_statements(conn)
+            execute_prepared(cursor, webhook_statement(params), params)
+            
+            log_id, contact_id, was_inserted = cursor.fetchone()
+            logger.info("Database operation completed - Log ID: %s, Contact ID: %s, Inserted: %s", log_id, contact_id, was_inserted)
         
-        logger.info(f"{'Created' if was_inserted else 'Updated'} contact: {name} (matched by {'email' if email else 'LinkedIn URL'})")
+        logger.info("%s contact: %s (matched by %s)", 'Created' if was_inserted else 'Updated', name, 'email' if email else 'LinkedIn URL')
         
         return jsonify({
             'status': 'success',
@@ -442,53 +729,169 @@ def webhook():
         
     except Exception as e:
         logger.error(f"Webhook processing error: {e}", exc_info=True)
-        try:
-            if 'conn' in locals() and conn:
-                conn.rollback()
-        except:
-            pass
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
 
-@app.route('/export', methods=['GET'])
-def export():
-    """Export all contacts as JSON"""
+@app.route('/webhook/batch', methods=['POST'])
+def webhook_batch():
+    """Receive a JSON array of webhook payloads and write them in one transaction"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        raw_body = request.get_data(cache=False)
+        items = parse_json_body(raw_body) if raw_body else None
+        
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            logger.error("Batch webhook body is not a JSON array of objects")
+            return jsonify({'error': 'Expected a JSON array of objects'}), 400
         
-        cursor.execute("""
-            SELECT id, name, title, company, location, email, 
-                   linkedin_url, website, profile_data, 
-                   created_at, updated_at
-            FROM linkedin_contacts
-            ORDER BY created_at DESC
-        """)
+        statements = []
+        skipped_rows = []
+        for item in items:
+            params = webhook_params(item, orjson.dumps(item).decode())
+            if params['email'] or params['linkedin_url']:
+                statements.append((webhook_statement(params), params))
+            else:
+                skipped_rows.append(skipped_log_row(params))
         
-        contacts = cursor.fetchall()
+        # Contacts are upserted in order, so repeated emails/URLs within a batch
+        # update the same row; logs for skipped items go in one multi-row INSERT
+        with db() as conn, conn.cursor() as cursor:
+            prepare_webhook_statements(conn)
+            execute_prepared_batch(cursor, statements)
+            if skipped_rows:
+                execute_values(cursor, WEBHOOK_LOG_BATCH_SQL, skipped_rows, page_size=LOG_BATCH_SIZE)
         
-        # Convert datetime objects to strings
-        for contact in contacts:
-            if contact['created_at']:
-                contact['created_at'] = contact['created_at'].isoformat()
-            if contact['updated_at']:
-                contact['updated_at'] = contact['updated_at'].isoformat()
+        logger.info("Batch webhook processed - %d contacts, %d skipped", len(statements), len(skipped_rows))
+        
+        return jsonify({
+            'status': 'success',
+            'received': len(items),
+            'processed': len(statements),
+            'skipped': len(skipped_rows)
+        })
+        
+    except Exception as e:
+        logger.error(f"Batch webhook processing error: {e}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+# Contacts are serialized to JSON by Postgres; the ::text cast keeps psycopg2
+# from parsing each row back into a dict
+EXPORT_CONTACTS_SQL = """
+    SELECT row_to_json(c)::text
+    FROM (
+        SELECT id, name, title, company, location, email, 
+               linkedin_url, website, profile_data, 
+               created_at, updated_at
+        FROM linkedin_contacts
+        ORDER BY created_at DESC
+    ) c
+"""
+
+# Overall statistics, company distribution and recent activity in one round-trip.
+# Company counts come from the contact_company_counts view (up to an hour stale).
+STATS_SQL = """
+    SELECT json_build_object(
+        'overall', (
+            SELECT row_to_json(o) FROM (
+                SELECT 
+                    COUNT(*) as total_contacts,
+                    COUNT(DISTINCT company) as unique_companies,
+                    COUNT(DISTINCT location) as unique_locations,
+                    MIN(created_at) as first_contact,
+                    MAX(created_at) as last_contact
+                FROM linkedin_contacts
+            ) o
+        ),
+        'top_companies', COALESCE((
+            SELECT json_agg(t ORDER BY t.count DESC) FROM (
+                SELECT company, count
+                FROM contact_company_counts
+                ORDER BY count DESC
+                LIMIT 10
+            ) t
+        ), '[]'),
+        'recent_activity', COALESCE((
+            SELECT json_agg(r ORDER BY r.date DESC) FROM (
+                SELECT 
+                    DATE(received_at) as date,
+                    COUNT(*) as webhook_count
+                FROM webhook_logs
+                WHERE received_at > CURRENT_TIMESTAMP - INTERVAL '7 days'
+                GROUP BY DATE(received_at)
+            ) r
+        ), '[]')
+    )::text
+"""
+
+# Company counts view maintenance; the advisory lock keeps workers from
+# refreshing it at the same time
+COMPANY_COUNTS_REFRESH_INTERVAL = 3600
+COMPANY_COUNTS_LOCK_ID = 7201
+REFRESH_COMPANY_COUNTS_SQL = "REFRESH MATERIALIZED VIEW CONCURRENTLY contact_company_counts"
+
+def refresh_company_counts():
+    """Refresh the company counts view unless another worker is already refreshing it"""
+    with db() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (COMPANY_COUNTS_LOCK_ID,))
+        if cursor.fetchone()[0]:
+            cursor.execute(REFRESH_COMPANY_COUNTS_SQL)
+
+def _run_company_counts_refresher():
+    """Background loop that refreshes the company counts view hourly"""
+    while True:
+        time.sleep(COMPANY_COUNTS_REFRESH_INTERVAL)
+        try:
+            refresh_company_counts()
+        except Exception as e:
+            logger.error(f"Company counts refresh error: {e}")
+
+def export_contacts(ndjson=False):
+    """Stream contacts from a server-side cursor as chunks of a JSON array,
+    or of newline-delimited JSON when ndjson is set.
+    
+    The first value yielded is None, once the query is running, so callers can
+    surface connection errors before the response starts.
+    """
+    with db() as conn, conn.cursor(name='export_contacts') as cursor:
+        cursor.execute(EXPORT_CONTACTS_SQL)
+        yield None
         
-        cursor.close()
-        conn.close()
+        # Rows arrive already serialized by Postgres; each fetched batch is
+        # joined into one chunk so the server writes once per batch, not per row
+        if ndjson:
+            while True:
+                rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    return
+                yield b''.join(contact.encode() + b'\n' for (contact,) in rows)
         
-        # Create temporary file for download
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            json.dump(contacts, f, indent=2)
-            temp_filename = f.name
+        separator = b'[\n'
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield separator + b',\n'.join(contact.encode() for (contact,) in rows)
+            separator = b',\n'
+        yield b'[]' if separator == b'[\n' else b'\n]\n'
+
+@app.route('/export', methods=['GET'])
+def export():
+    """Export all contacts as JSON (or NDJSON with ?format=ndjson)"""
+    try:
+        ndjson = request.args.get('format') == 'ndjson'
+        chunks = export_contacts(ndjson)
+        next(chunks)
         
-        return send_file(
-            temp_filename,
-            mimetype='application/json',
-            as_attachment=True,
-            download_name=f'linkedin_contacts_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+        return Response(
+            chunks,
+            mimetype='application/x-ndjson' if ndjson else 'application/json',
+            headers={
+                'Content-Disposition': f'attachment; filename=linkedin_contacts_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{"ndjson" if ndjson else "json"}'
+            }
         )
         
     except Exception as e:
@@ -502,61 +905,11 @@ def export():
 def stats():
     """Get detailed statistics about collected data"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Overall statistics
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_contacts,
-                COUNT(DISTINCT company) as unique_companies,
-                COUNT(DISTINCT location) as unique_locations,
-                MIN(created_at) as first_contact,
-                MAX(created_at) as last_contact
-            FROM linkedin_contacts
-        """)
-        overall_stats = cursor.fetchone()
-        
-        # Company distribution
-        cursor.execute("""
-            SELECT company, COUNT(*) as count
-            FROM linkedin_contacts
-            WHERE company IS NOT NULL AND company != ''
-            GROUP BY company
-            ORDER BY count DESC
-            LIMIT 10
-        """)
-        top_companies = cursor.fetchall()
+        with db() as conn, conn.cursor() as cursor:
+            cursor.execute(STATS_SQL)
+            stats_json = cursor.fetchone()[0]
         
-        # Recent activity
-        cursor.execute("""
-            SELECT 
-                DATE(received_at) as date,
-                COUNT(*) as webhook_count
-            FROM webhook_logs
-            WHERE received_at > CURRENT_TIMESTAMP - INTERVAL '7 days'
-            GROUP BY DATE(received_at)
-            ORDER BY date DESC
-        """)
-        recent_activity = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
-        # Format dates
-        if overall_stats['first_contact']:
-            overall_stats['first_contact'] = overall_stats['first_contact'].isoformat()
-        if overall_stats['last_contact']:
-            overall_stats['last_contact'] = overall_stats['last_contact'].isoformat()
-        
-        for activity in recent_activity:
-            activity['date'] = activity['date'].isoformat()
-        
-        return jsonify({
-            'overall': overall_stats,
-            'top_companies': top_companies,
-            'recent_activity': recent_activity
-        })
+        return Response(stats_json, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Stats error: {e}")
@@ -565,64 +918,92 @@ def stats():
             'message': str(e)
         }), 500
 
+# Probe storms share one database round-trip per HEALTH_PROBE_TTL seconds
+HEALTH_PROBE_TTL = 2.0
+_health_probe = (float('-inf'), None)  # (monotonic time of last probe, error or None)
+
+def probe_database():
+    """Test database connectivity, reusing a result less than HEALTH_PROBE_TTL old"""
+    global _health_probe
+    checked_at, error = _health_probe
+    now = time.monotonic()
+    if now - checked_at < HEALTH_PROBE_TTL:
+        return error
+    try:
+        with db(autocommit=True) as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        error = None
+    except Exception as e:
+        error = e
+    _health_probe = (now, error)
+    return error
+
 @app.route('/webhook/health', methods=['GET'])
 def webhook_health():
     """Health check endpoint specifically for webhook functionality"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Test database connectivity
-        cursor.execute("SELECT 1")
-        
-        cursor.close()
-        conn.close()
-        
+    error = probe_database()
+    if error is None:
         return jsonify({
             'status': 'healthy',
             'database': 'connected',
             'timestamp': datetime.now().isoformat()
         })
-        
-    except Exception as e:
-        logger.error(f"Webhook health check failed: {e}")
-        return jsonify({
-            'status': 'unhealthy',
-            'database': 'error',
-            'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+    
+    logger.error(f"Webhook health check failed: {error}")
+    return jsonify({
+        'status': 'unhealthy',
+        'database': 'error',
+        'error': str(error),
+        'timestamp': datetime.now().isoformat()
+    }), 500
+
+# Logs are paged by keyset: the next page starts below the (received_at, log_id)
+# of the last row returned, so deep pages cost the same as the first
+WEBHOOK_LOGS_SQL = """
+    SELECT log_id, event_type, contact_email, contact_id, contact_name,
+           linkedin_url, received_at, processed, processing_notes
+    FROM webhook_logs
+    ORDER BY received_at DESC, log_id DESC
+    LIMIT %s
+"""
+WEBHOOK_LOGS_BEFORE_SQL = """
+    SELECT log_id, event_type, contact_email, contact_id, contact_name,
+           linkedin_url, received_at, processed, processing_notes
+    FROM webhook_logs
+    WHERE (received_at, log_id) < (%s, %s)
+    ORDER BY received_at DESC, log_id DESC
+    LIMIT %s
+"""
 
 @app.route('/webhook/logs', methods=['GET'])
 def webhook_logs():
     """View recent webhook logs"""
     try:
         limit = request.args.get('limit', 50, type=int)
+        before = request.args.get('before')
+        # Without before_id, every row at the before timestamp is excluded
+        before_id = request.args.get('before_id', 0, type=int)
         
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        if before:
+            try:
+                before = datetime.fromisoformat(before)
+            except ValueError:
+                return jsonify({'error': 'before must be an ISO 8601 timestamp'}), 400
         
-        cursor.execute("""
-            SELECT log_id, event_type, contact_email, contact_id, contact_name,
-                   linkedin_url, received_at, processed, processing_notes
-            FROM webhook_logs
-            ORDER BY received_at DESC
-            LIMIT %s
-        """, (limit,))
-        
-        logs = cursor.fetchall()
-        
-        # Format dates
-        for log in logs:
-            if log['received_at']:
-                log['received_at'] = log['received_at'].isoformat()
-        
-        cursor.close()
-        conn.close()
+        with db() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            if before:
+                cursor.execute(WEBHOOK_LOGS_BEFORE_SQL, (before, before_id, limit))
+            else:
+                cursor.execute(WEBHOOK_LOGS_SQL, (limit,))
+            
+            logs = cursor.fetchall()
         
         return jsonify({
             'count': len(logs),
-            'logs': logs
+            'logs': logs,
+            # Pass both back as ?before=...&before_id=... for the next page
+            'next_before': logs[-1]['received_at'] if logs else None,
+            'next_before_id': logs[-1]['log_id'] if logs else None
         })
         
     except Exception as e:
@@ -634,31 +1015,28 @@ def webhook_logs():
 
 # Initialize database on startup (with singleton pattern)
 _db_initialized = False
-_init_lock = False
+_init_lock = threading.Lock()
 
 def ensure_db_initialized():
     """Ensure database is initialized only once"""
-    global _db_initialized, _init_lock
+    global _db_initialized
     
     if _db_initialized:
         return
     
-    # Simple lock to prevent multiple workers from initializing
-    if _init_lock:
-        import time
-        time.sleep(2)  # Wait for other worker to finish
-        return
-    
-    _init_lock = True
-    try:
-        logger.info("Initializing database tables...")
-        init_database()
-        _db_initialized = True
-        logger.info("Database initialization complete")
-    except Exception as e:
-        logger.error(f"Failed to initialize database: {e}")
-    finally:
-        _init_lock = False
+    # Threads in this process wait here; other workers wait on the advisory
+    # lock taken inside init_database()
+    with _init_lock:
+        if _db_initialized:
+            return
+        try:
+            logger.info("Initializing database tables...")
+            init_database()
+            _db_initialized = True
+            logger.info("Database initialization complete")
+            threading.Thread(target=_run_company_counts_refresher, name='company-counts-refresher', daemon=True).start()
+        except Exception as e:
+            logger.error(f"Failed to initialize database: {e}")
 
 # Initialize on startup
 ensure_db_initialized()
@@ -1,11 +1,19 @@
-from flask import Flask, request, jsonify, send_file
-import json
+from flask import Flask, Response, request, jsonify
+import orjson
+from json_provider import OrjsonProvider
 from datetime import datetime
 import logging
 import sys
 import sqlite3
 import os
-import io
+import queue
+import threading
+from concurrent.futures import Future
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; only /export?format=msgpack needs it
+    msgpack = None
 
 # Configure logging to ensure output goes to stdout
 logging.basicConfig(
@@ -15,6 +23,7 @@ logging.basicConfig(
 )
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 logger = logging.getLogger(__name__)
 
 # Database file path - will be created in the app directory
@@ -37,11 +46,59 @@ def init_db():
             website_url TEXT,
             website_text TEXT,
             profile_url TEXT,
-            raw_data TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # Raw webhook bodies live in a sidecar table so scans of the contacts
+    # table (/export, /stats) don't read through the payloads
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS linkedin_contacts_raw (
+            contact_id INTEGER PRIMARY KEY REFERENCES linkedin_contacts(id),
+            raw BLOB
+        )
+    ''')
+    # Older databases kept raw_data inline; move it to the sidecar once, as BLOB
+    # like the bodies stored since, so readers always get bytes. The write lock
+    # is taken before checking so concurrent workers don't both migrate.
+    cursor.execute("BEGIN IMMEDIATE")
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(linkedin_contacts)")]
+    if 'raw_data' in columns:
+        cursor.execute('''
+            INSERT OR IGNORE INTO linkedin_contacts_raw (contact_id, raw)
+            SELECT id, CAST(raw_data AS BLOB) FROM linkedin_contacts WHERE raw_data IS NOT NULL
+        ''')
+        cursor.execute("ALTER TABLE linkedin_contacts DROP COLUMN raw_data")
+    conn.commit()
+    # Lets /stats group contacts by day from the index alone, newest first
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_created_date
+        ON linkedin_contacts(DATE(created_at))
+    ''')
+    # Contact count kept up to date by a trigger, so / and /stats don't scan
+    # the table. The trigger is created before the row is seeded so no insert
+    # in between is missed; /clear resets the count itself.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS count_linkedin_contacts
+        AFTER INSERT ON linkedin_contacts
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'contact_count';
+        END
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO meta (key, value)
+        SELECT 'contact_count', COUNT(*) FROM linkedin_contacts
+    ''')
+    conn.commit()
+    # WAL lets readers run alongside the writer and replaces the rollback
+    # journal's per-commit fsyncs; the setting is stored in the database file
+    cursor.execute("PRAGMA journal_mode=WAL")
     conn.commit()
     conn.close()
     logger.info("Database initialized")
@@ -49,22 +106,132 @@ def init_db():
 # Initialize DB on startup
 init_db()
 
+CONTACT_COUNT_SQL = "SELECT value FROM meta WHERE key = 'contact_count'"
+
+# Read endpoints reuse one read-only connection per thread instead of opening
+# the database (and its -wal/-shm files) on every request
+_read_local = threading.local()
+
+# Page cache per connection, in KiB (negative); SQLite's default is 2 MB.
+# Pages are only allocated as they are read, so small databases use less.
+SQLITE_CACHE_SIZE = -65536
+
+def get_read_conn():
+    """Return this thread's read-only connection, opening it on first use"""
+    conn = getattr(_read_local, 'conn', None)
+    if conn is None:
+        conn = _read_local.conn = sqlite3.connect(f'file:{DB_FILE}?mode=ro', uri=True)
+        # Keeps repeated /stats and /export scans in memory between requests
+        conn.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+# Update if email exists, insert if new. Updating in place keeps the row's id
+# and created_at (INSERT OR REPLACE deleted and re-inserted it).
+INSERT_CONTACT_SQL = '''
+    INSERT INTO linkedin_contacts 
+    (name, title, company, location, email, linkedin_url, 
+     website_url, website_text, profile_url, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(email) DO UPDATE SET
+        name = excluded.name,
+        title = excluded.title,
+        company = excluded.company,
+        location = excluded.location,
+        linkedin_url = excluded.linkedin_url,
+        website_url = excluded.website_url,
+        website_text = excluded.website_text,
+        profile_url = excluded.profile_url,
+        updated_at = excluded.updated_at
+    RETURNING id
+'''
+
+INSERT_CONTACT_RAW_SQL = '''
+    INSERT INTO linkedin_contacts_raw (contact_id, raw)
+    VALUES (?, ?)
+    ON CONFLICT(contact_id) DO UPDATE SET raw = excluded.raw
+'''
+
+# All writes share one long-lived connection, serialized by _write_lock.
+# synchronous=NORMAL is durable across application crashes in WAL mode; only
+# an OS crash or power loss can roll back the last commits. The connection's
+# statement cache keeps INSERT_CONTACT_SQL compiled, and writes reuse one cursor.
+_write_conn = sqlite3.connect(DB_FILE, check_same_thread=False, cached_statements=128)
+_write_conn.execute("PRAGMA synchronous=NORMAL")
+_write_conn.execute("PRAGMA temp_store=MEMORY")
+_write_conn.execute("PRAGMA mmap_size=268435456")
+_write_conn.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+_write_conn.execute("PRAGMA wal_autocheckpoint=1000")
+_write_cursor = _write_conn.cursor()
+_write_lock = threading.Lock()
+
+# Contact writes are queued by request threads and committed by one writer
+# thread, so a burst of webhooks shares a single transaction (one fsync)
+WRITE_BATCH_SIZE = 500
+_write_queue = queue.Queue()
+
+def write_contacts(batch):
+    """Insert (params, raw body, future) items in one transaction and resolve each future with its row id"""
+    with _write_lock:
+        try:
+            contact_ids = []
+            for params, raw_data, _ in batch:
+                _write_cursor.execute(INSERT_CONTACT_SQL, params)
+                contact_id = _write_cursor.fetchone()[0]
+                _write_cursor.execute(INSERT_CONTACT_RAW_SQL, (contact_id, raw_data))
+                contact_ids.append(contact_id)
+            _write_conn.commit()
+        except Exception:
+            _write_conn.rollback()
+            raise
+    for (_, _, future), contact_id in zip(batch, contact_ids):
+        future.set_result(contact_id)
+
+def _run_contact_writer():
+    """Background loop that commits whatever contact writes have queued up"""
+    while True:
+        batch = [_write_queue.get()]
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                batch.append(_write_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            write_contacts(batch)
+        except Exception:
+            # Retry one at a time so a failing row only fails its own request
+            for item in batch:
+                try:
+                    write_contacts([item])
+                except Exception as e:
+                    item[2].set_exception(e)
+
+threading.Thread(target=_run_contact_writer, name='contact-writer', daemon=True).start()
+
+def save_contact(params, raw_data):
+    """Queue a contact write and wait for the writer to commit it; returns the row id"""
+    future = Future()
+    _write_queue.put((params, raw_data, future))
+    return future.result()
+
+# CORS headers added to every response
+_CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Headers', 'Content-Type,Authorization'),
+    ('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS'),
+)
+
 # Add CORS support
 @app.after_request
 def after_request(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.extend(_CORS_HEADERS)
     return response
 
 @app.route('/', methods=['GET'])
 def home():
     """Home endpoint with status info"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM linkedin_contacts")
+    cursor = get_read_conn().execute(CONTACT_COUNT_SQL)
     count = cursor.fetchone()[0]
-    conn.close()
     
     return jsonify({
         "status": "running",
@@ -89,8 +256,9 @@ def webhook():
     logger.info(f"Webhook received at {timestamp}")
     
     try:
-        # Get JSON data
-        data = request.get_json()
+        # Parse the raw body with orjson instead of going through Flask's decoder
+        raw_body = request.get_data(cache=False)
+        data = orjson.loads(raw_body) if raw_body else None
         
         if not data:
             logger.error("No JSON data received")
@@ -102,17 +270,9 @@ def webhook():
         website_url = websites[0].get('url', '') if websites else ''
         website_text = websites[0].get('text', '') if websites else ''
         
-        # Store in database
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Update if email exists, insert if new
-        cursor.execute('''
-            INSERT OR REPLACE INTO linkedin_contacts 
-            (name, title, company, location, email, linkedin_url, 
-             website_url, website_text, profile_url, raw_data, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        # Store in database with the body as received; the writer thread commits it
+        # with any other queued contacts
+        contact_id = save_contact((
             data.get('name', ''),
             data.get('title', ''),
             data.get('company', ''),
@@ -122,13 +282,8 @@ def webhook():
             website_url,
             website_text,
             data.get('profileUrl', ''),
-            json.dumps(data),
             timestamp
-        ))
-        
-        conn.commit()
-        contact_id = cursor.lastrowid
-        conn.close()
+        ), raw_body)
         
         logger.info(f"Contact saved: {data.get('name')} - {contact_info.get('email')}")
         
@@ -143,46 +298,78 @@ def webhook():
         logger.error(f"Error processing webhook: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/export', methods=['GET'])
-def export():
-    """Export all collected contacts as JSON"""
+EXPORT_CONTACTS_SQL = '''
+    SELECT name, title, company, location, email, linkedin_url,
+           website_url, profile_url, created_at, updated_at
+    FROM linkedin_contacts
+    ORDER BY updated_at DESC
+'''
+
+# Rows read and written per response chunk when streaming /export
+EXPORT_FETCH_SIZE = 1000
+
+# /export?format= value -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'msgpack': ('application/x-msgpack', 'msgpack'),
+}
+
+def export_contacts(fmt='json'):
+    """Stream the export document, writing contacts in chunks as they are read.
+    
+    fmt 'json' writes the export document; 'ndjson' writes one contact per line
+    and 'msgpack' a stream of one packed map per contact, both without the
+    timestamp/total wrapper. A leading None is yielded once the query runs.
+    """
+    cursor = get_read_conn().execute(EXPORT_CONTACTS_SQL)
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT name, title, company, location, email, linkedin_url,
-                   website_url, profile_url, created_at, updated_at
-            FROM linkedin_contacts
-            ORDER BY updated_at DESC
-        ''')
-        
         columns = [desc[0] for desc in cursor.description]
-        contacts = []
-        
-        for row in cursor.fetchall():
-            contact = dict(zip(columns, row))
-            contacts.append(contact)
+        yield None
         
-        conn.close()
+        if fmt != 'json':
+            pack = msgpack.packb if fmt == 'msgpack' else lambda contact: orjson.dumps(contact) + b'\n'
+            while True:
+                rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    return
+                yield b''.join(pack(dict(zip(columns, row))) for row in rows)
         
-        # Create JSON response
-        export_data = {
-            "export_timestamp": datetime.now().isoformat(),
-            "total_contacts": len(contacts),
-            "contacts": contacts
-        }
+        yield b'{"export_timestamp":' + orjson.dumps(datetime.now().isoformat()) + b',"contacts":['
+        total = 0
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            chunk = b','.join(orjson.dumps(dict(zip(columns, row))) for row in rows)
+            yield chunk if total == 0 else b',' + chunk
+            total += len(rows)
+        # The count is only known once every row has been written
+        yield b'],"total_contacts":' + str(total).encode() + b'}'
+    finally:
+        cursor.close()
+
+@app.route('/export', methods=['GET'])
+def export():
+    """Export all collected contacts as JSON (or ?format=ndjson / ?format=msgpack)"""
+    try:
+        fmt = request.args.get('format', 'json')
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+        if fmt == 'msgpack' and msgpack is None:
+            return jsonify({"error": "msgpack export requires the msgpack package"}), 400
+        mimetype, extension = EXPORT_FORMATS[fmt]
         
-        # Return as downloadable file
-        output = io.BytesIO()
-        output.write(json.dumps(export_data, indent=2).encode('utf-8'))
-        output.seek(0)
+        chunks = export_contacts(fmt)
+        next(chunks)
         
-        return send_file(
-            output,
-            mimetype='application/json',
-            as_attachment=True,
-            download_name=f'linkedin_contacts_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+        # Streamed as a downloadable file
+        return Response(
+            chunks,
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename=linkedin_contacts_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+            }
         )
         
     except Exception as e:
@@ -193,11 +380,10 @@ def export():
 def stats():
     """Get statistics about collected contacts"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        cursor = get_read_conn().cursor()
         
         # Total contacts
-        cursor.execute("SELECT COUNT(*) FROM linkedin_contacts")
+        cursor.execute(CONTACT_COUNT_SQL)
         total = cursor.fetchone()[0]
         
         # Contacts by day
@@ -219,8 +405,6 @@ def stats():
         ''')
         recent = cursor.fetchall()
         
-        conn.close()
-        
         return jsonify({
             "total_contacts": total,
             "daily_collection": [{"date": d[0], "count": d[1]} for d in daily_stats],
@@ -243,12 +427,16 @@ def clear():
         }), 400
     
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM linkedin_contacts")
-        deleted = cursor.rowcount
-        conn.commit()
-        conn.close()
+        with _write_lock:
+            try:
+                _write_conn.execute("DELETE FROM linkedin_contacts_raw")
+                cursor = _write_conn.execute("DELETE FROM linkedin_contacts")
+                deleted = cursor.rowcount
+                _write_conn.execute("UPDATE meta SET value = 0 WHERE key = 'contact_count'")
+                _write_conn.commit()
+            except Exception:
+                _write_conn.rollback()
+                raise
         
         logger.info(f"Cleared {deleted} contacts from database")
         
@@ -9,25 +9,50 @@ import psycopg2
 from psycopg2 import pool
 from urllib.parse import urlparse
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
-class DatabaseConfig:
-    """Manages database configuration and connection pooling"""
+# Optional synchronous_commit for pooled sessions ('off' or 'local'). Commits
+# then return before their WAL is flushed; a server crash can lose the last
+# few hundred milliseconds of commits, but never corrupts data.
+WEBHOOK_SYNC_COMMIT = os.environ.get('WEBHOOK_SYNC_COMMIT')
+
+# Pool bounds; PG_POOL_MAX is shared with app_postgres.py so a concurrent
+# load test can be given as many connections as the app
+DB_POOL_MIN = 1
+DB_POOL_MAX = int(os.environ.get('PG_POOL_MAX', 10))
+
+# Shown in pg_stat_activity, so these sessions can be told apart from the app's
+APPLICATION_NAME = 'webhook-listener-scripts'
+
+def connection_kwargs(database_url):
+    """psycopg2.connect() keyword arguments for a postgresql:// URL"""
+    parsed = urlparse(database_url)
+    return {
+        "host": parsed.hostname,
+        "database": parsed.path[1:],
+        "user": parsed.username,
+        "password": parsed.password,
+        "port": parsed.port or 5432
+    }
+
+class _DatabaseConfig:
+    """Manages database configuration and connection pooling; use the module-level db_config"""
     
-    _instance = None
     _connection_pool = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(DatabaseConfig, cls).__new__(cls)
-        return cls._instance
+    # Set once the first get_connection() has tried to create the pool
+    _pool_attempted = False
+    # Set once test_database_connection() has succeeded
+    _probe_ok = False
     
     def __init__(self):
-        if not hasattr(self, 'initialized'):
-            self.initialized = True
-            self.database_url = self._get_database_url()
-            self._init_connection_pool()
+        self.database_url = self._get_database_url()
+        # The URL is parsed once; the pool and get_connection_info() reuse it
+        self._conn_kwargs = connection_kwargs(self.database_url) if self.database_url else None
+        # The pool is created on first use, so importing this module (e.g. for
+        # connection_kwargs) never opens a connection
+        self._pool_lock = threading.Lock()
     
     def _get_database_url(self):
         """Get database URL from various sources"""
@@ -46,11 +71,15 @@ class DatabaseConfig:
         if os.path.exists('.env'):
             try:
                 with open('.env', 'r') as f:
-                    for line in f:
-                        if line.startswith('DATABASE_URL='):
-                            return line.strip().split('=', 1)[1]
-                        if line.startswith('RENDER_DATABASE_URL='):
-                            return line.strip().split('=', 1)[1]
+                    text = f.read()
+                env = dict(
+                    line.strip().split('=', 1)
+                    for line in text.splitlines()
+                    if '=' in line and not line.startswith('#')
+                )
+                db_url = env.get('DATABASE_URL') or env.get('RENDER_DATABASE_URL')
+                if db_url:
+                    return db_url
             except Exception:
                 pass
         
@@ -74,17 +103,15 @@ class DatabaseConfig:
             return
         
         try:
-            parsed = urlparse(self.database_url)
+            pool_kwargs = dict(self._conn_kwargs, application_name=APPLICATION_NAME, connect_timeout=10)
+            if WEBHOOK_SYNC_COMMIT:
+                pool_kwargs['options'] = f'-c synchronous_commit={WEBHOOK_SYNC_COMMIT}'
             
             # Create connection pool
             self._connection_pool = psycopg2.pool.ThreadedConnectionPool(
-                minconn=1,
-                maxconn=10,
-                host=parsed.hostname,
-                database=parsed.path[1:],
-                user=parsed.username,
-                password=parsed.password,
-                port=parsed.port or 5432
+                minconn=DB_POOL_MIN,
+                maxconn=DB_POOL_MAX,
+                **pool_kwargs
             )
             logger.info("Database connection pool initialized")
             
@@ -93,7 +120,13 @@ class DatabaseConfig:
             self._connection_pool = None
     
     def get_connection(self):
-        """Get a connection from the pool"""
+        """Get a connection from the pool, creating the pool on first use"""
+        if not self._pool_attempted:
+            with self._pool_lock:
+                if not self._pool_attempted:
+                    self._init_connection_pool()
+                    self._pool_attempted = True
+        
         if not self._connection_pool:
             raise ValueError("Database connection pool not initialized")
         
@@ -120,19 +153,18 @@ class DatabaseConfig:
         if not self.database_url:
             return {"configured": False}
         
-        parsed = urlparse(self.database_url)
         return {
             "configured": True,
-            "host": parsed.hostname,
-            "port": parsed.port or 5432,
-            "database": parsed.path[1:],
-            "user": parsed.username,
-            "pool_size": self._connection_pool.maxconn if self._connection_pool else 0
+            "host": self._conn_kwargs["host"],
+            "port": self._conn_kwargs["port"],
+            "database": self._conn_kwargs["database"],
+            "user": self._conn_kwargs["user"],
+            "pool_size": DB_POOL_MAX
         }
 
 
-# Singleton instance
-db_config = DatabaseConfig()
+# Shared instance; the class is not meant to be constructed elsewhere
+db_config = _DatabaseConfig()
 
 
 def get_db_connection():
@@ -146,7 +178,9 @@ def return_db_connection(conn):
 
 
 def test_database_connection():
-    """Test database connectivity"""
+    """Test database connectivity; a successful probe is remembered for the process"""
+    if db_config._probe_ok:
+        return True
     try:
         conn = db_config.get_connection()
         cursor = conn.cursor()
@@ -154,6 +188,7 @@ def test_database_connection():
         result = cursor.fetchone()
         cursor.close()
         db_config.return_connection(conn)
+        db_config._probe_ok = True
         return True
     except Exception as e:
         logger.error(f"Database connection test failed: {e}")
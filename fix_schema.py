@@ -6,8 +6,8 @@ Adds missing processing_notes column to webhook_logs table
 
 import os
 import psycopg2
-from urllib.parse import urlparse
 import logging
+from db_config import connection_kwargs
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,18 +19,8 @@ def get_db_connection():
     if not database_url:
         raise ValueError("DATABASE_URL environment variable is required")
     
-    parsed = urlparse(database_url)
-    
     try:
-        conn = psycopg2.connect(
-            host=parsed.hostname,
-            database=parsed.path[1:],
-            user=parsed.username,
-            password=parsed.password,
-            port=parsed.port or 5432,
-            connect_timeout=10
-        )
-        return conn
+        return psycopg2.connect(**connection_kwargs(database_url), connect_timeout=10)
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         raise
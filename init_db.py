@@ -7,8 +7,9 @@ Run this to set up or migrate the PostgreSQL database schema
 import os
 import sys
 import psycopg2
-from urllib.parse import urlparse
+from psycopg2.extras import execute_values
 import logging
+from db_config import connection_kwargs
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,36 +31,79 @@ def get_database_url():
     return db_url
 
 def test_connection(db_url):
-    """Test database connection"""
+    """Open the database connection used for the rest of the run, or None if it fails"""
     try:
-        parsed = urlparse(db_url)
-        conn = psycopg2.connect(
-            host=parsed.hostname,
-            database=parsed.path[1:],
-            user=parsed.username,
-            password=parsed.password,
-            port=parsed.port or 5432,
-            connect_timeout=10
-        )
-        conn.close()
+        conn = psycopg2.connect(**connection_kwargs(db_url), connect_timeout=10)
         logger.info("Database connection successful")
-        return True
+        return conn
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
-        return False
+        return None
 
-def init_schema(db_url):
-    """Initialize database schema"""
-    parsed = urlparse(db_url)
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS linkedin_contacts (
+        id SERIAL PRIMARY KEY,
+        name TEXT,
+        title TEXT,
+        company TEXT,
+        location TEXT,
+        email TEXT UNIQUE,
+        linkedin_url TEXT,
+        website TEXT,
+        profile_data TEXT,
+        raw_json JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_email 
+    ON linkedin_contacts(email);
+    
+    CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_company 
+    ON linkedin_contacts(company);
     
+    CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_created 
+    ON linkedin_contacts(created_at DESC);
+    
+    CREATE TABLE IF NOT EXISTS webhook_logs (
+        log_id SERIAL PRIMARY KEY,
+        event_type TEXT,
+        contact_email TEXT,
+        contact_id INTEGER,
+        webhook_data JSONB,
+        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        processed BOOLEAN DEFAULT FALSE,
+        processing_notes TEXT
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_webhook_logs_received 
+    ON webhook_logs(received_at DESC);
+    
+    CREATE INDEX IF NOT EXISTS idx_webhook_logs_email 
+    ON webhook_logs(contact_email);
+    
+    CREATE OR REPLACE FUNCTION update_updated_at_column()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.updated_at = CURRENT_TIMESTAMP;
+        RETURN NEW;
+    END;
+    $$ language 'plpgsql';
+    
+    DROP TRIGGER IF EXISTS update_linkedin_contacts_updated_at ON linkedin_contacts;
+    CREATE TRIGGER update_linkedin_contacts_updated_at 
+    BEFORE UPDATE ON linkedin_contacts 
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+"""
+
+EXISTING_COUNTS_SQL = """
+    SELECT (SELECT COUNT(*) FROM linkedin_contacts),
+           (SELECT COUNT(*) FROM webhook_logs)
+"""
+
+def init_schema(conn):
+    """Initialize database schema"""
     try:
-        conn = psycopg2.connect(
-            host=parsed.hostname,
-            database=parsed.path[1:],
-            user=parsed.username,
-            password=parsed.password,
-            port=parsed.port or 5432
-        )
         cursor = conn.cursor()
         
         # Start transaction
@@ -67,89 +111,10 @@ def init_schema(db_url):
         
         logger.info("Creating tables...")
         
-        # Create linkedin_contacts table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS linkedin_contacts (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255),
-                title VARCHAR(500),
-                company VARCHAR(255),
-                location VARCHAR(255),
-                email VARCHAR(255) UNIQUE,
-                linkedin_url VARCHAR(500),
-                website VARCHAR(500),
-                profile_data TEXT,
-                raw_json JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create indexes
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_email 
-            ON linkedin_contacts(email)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_company 
-            ON linkedin_contacts(company)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_linkedin_contacts_created 
-            ON linkedin_contacts(created_at DESC)
-        """)
-        
-        # Create webhook_logs table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS webhook_logs (
-                log_id SERIAL PRIMARY KEY,
-                event_type VARCHAR(100),
-                contact_email VARCHAR(255),
-                contact_id VARCHAR(100),
-                webhook_data JSONB,
-                received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                processed BOOLEAN DEFAULT FALSE,
-                processing_notes TEXT
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_webhook_logs_received 
-            ON webhook_logs(received_at DESC)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_webhook_logs_email 
-            ON webhook_logs(contact_email)
-        """)
-        
-        # Create update trigger function
-        cursor.execute("""
-            CREATE OR REPLACE FUNCTION update_updated_at_column()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                NEW.updated_at = CURRENT_TIMESTAMP;
-                RETURN NEW;
-            END;
-            $$ language 'plpgsql';
-        """)
-        
-        # Create trigger
-        cursor.execute("""
-            DROP TRIGGER IF EXISTS update_linkedin_contacts_updated_at ON linkedin_contacts;
-            CREATE TRIGGER update_linkedin_contacts_updated_at 
-            BEFORE UPDATE ON linkedin_contacts 
-            FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
-        """)
-        
-        # Check existing data
-        cursor.execute("SELECT COUNT(*) FROM linkedin_contacts")
-        contact_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM webhook_logs")
-        log_count = cursor.fetchone()[0]
+        # Whole schema in one round trip, then both counts in a second
+        cursor.execute(SCHEMA_SQL)
+        cursor.execute(EXISTING_COUNTS_SQL)
+        contact_count, log_count = cursor.fetchone()
         
         # Commit transaction
         conn.commit()
@@ -158,17 +123,42 @@ def init_schema(db_url):
         logger.info(f"Existing data: {contact_count} contacts, {log_count} webhook logs")
         
         cursor.close()
-        conn.close()
         
         return True
         
     except Exception as e:
         logger.error(f"Failed to initialize schema: {e}")
-        if conn:
-            conn.rollback()
+        conn.rollback()
         return False
 
-def migrate_from_sqlite(db_url, sqlite_path='linkedin_contacts.db'):
+# SQLite rows are streamed, inserted and committed in batches of this many
+MIGRATE_BATCH_SIZE = 5000
+
+MIGRATE_CONTACTS_SQL = """
+    INSERT INTO linkedin_contacts 
+    (name, title, company, location, email, linkedin_url, 
+     website, profile_data, raw_json, created_at, updated_at)
+    VALUES %s
+    ON CONFLICT (email) DO NOTHING
+    RETURNING 1
+"""
+
+def migrate_rows_individually(pg_cursor, rows):
+    """Insert rows one at a time, skipping (and logging) any Postgres rejects;
+    returns how many were inserted. Each row gets a savepoint so a bad one
+    doesn't abort the rest of the transaction."""
+    migrated = 0
+    for row in rows:
+        pg_cursor.execute("SAVEPOINT migrate_row")
+        try:
+            migrated += len(execute_values(pg_cursor, MIGRATE_CONTACTS_SQL, [row], fetch=True))
+            pg_cursor.execute("RELEASE SAVEPOINT migrate_row")
+        except psycopg2.Error as e:
+            pg_cursor.execute("ROLLBACK TO SAVEPOINT migrate_row")
+            logger.warning(f"Failed to migrate contact {row[4]}: {e}")
+    return migrated
+
+def migrate_from_sqlite(pg_conn, sqlite_path='linkedin_contacts.db'):
     """Migrate data from SQLite to PostgreSQL"""
     if not os.path.exists(sqlite_path):
         logger.info("No SQLite database found to migrate")
@@ -191,15 +181,6 @@ def migrate_from_sqlite(db_url, sqlite_path='linkedin_contacts.db'):
         
         logger.info(f"Found {count} contacts to migrate")
         
-        # Connect to PostgreSQL
-        parsed = urlparse(db_url)
-        pg_conn = psycopg2.connect(
-            host=parsed.hostname,
-            database=parsed.path[1:],
-            user=parsed.username,
-            password=parsed.password,
-            port=parsed.port or 5432
-        )
         pg_cursor = pg_conn.cursor()
         
         # Migrate contacts
@@ -210,31 +191,36 @@ def migrate_from_sqlite(db_url, sqlite_path='linkedin_contacts.db'):
             FROM linkedin_contacts
         """)
         
+        # One multi-row INSERT per page instead of a round trip per contact;
+        # RETURNING counts the rows that were not skipped as duplicates.
+        # Committing each batch keeps memory and the open transaction bounded,
+        # and a re-run resumes past already-migrated emails. A batch containing
+        # a row Postgres rejects (e.g. invalid JSON for raw_json, a NUL byte in
+        # a text column) is retried row by row so only the bad rows are skipped.
         migrated = 0
-        for row in sqlite_cursor.fetchall():
+        while True:
+            rows = sqlite_cursor.fetchmany(MIGRATE_BATCH_SIZE)
+            if not rows:
+                break
             try:
-                pg_cursor.execute("""
-                    INSERT INTO linkedin_contacts 
-                    (name, title, company, location, email, linkedin_url, 
-                     website, profile_data, raw_json, created_at, updated_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (email) DO NOTHING
-                """, row)
-                migrated += pg_cursor.rowcount
-            except Exception as e:
-                logger.warning(f"Failed to migrate contact {row[4]}: {e}")
-        
-        pg_conn.commit()
+                inserted = execute_values(pg_cursor, MIGRATE_CONTACTS_SQL, rows, page_size=1000, fetch=True)
+                migrated += len(inserted)
+            except psycopg2.Error as e:
+                pg_conn.rollback()
+                logger.warning(f"Batch insert failed ({e}); retrying its {len(rows)} contacts one at a time")
+                migrated += migrate_rows_individually(pg_cursor, rows)
+            pg_conn.commit()
         
         logger.info(f"Successfully migrated {migrated} contacts")
         
         sqlite_conn.close()
-        pg_conn.close()
+        pg_cursor.close()
         
         return True
         
     except Exception as e:
         logger.error(f"Migration failed: {e}")
+        pg_conn.rollback()
         return False
 
 def main():
@@ -244,24 +230,28 @@ def main():
     # Get database URL
     db_url = get_database_url()
     
-    # Test connection
+    # Test connection; the same connection is reused for the schema and migration
     print("\nTesting database connection...")
-    if not test_connection(db_url):
+    conn = test_connection(db_url)
+    if conn is None:
         print("Failed to connect to database. Please check your URL and try again.")
         sys.exit(1)
     
-    # Initialize schema
-    print("\nInitializing database schema...")
-    if not init_schema(db_url):
-        print("Failed to initialize schema.")
-        sys.exit(1)
-    
-    # Ask about migration
-    if os.path.exists('linkedin_contacts.db'):
-        migrate = input("\nSQLite database found. Migrate existing data? (y/n): ").lower().strip()
-        if migrate == 'y':
-            print("\nMigrating data from SQLite...")
-            migrate_from_sqlite(db_url)
+    try:
+        # Initialize schema
+        print("\nInitializing database schema...")
+        if not init_schema(conn):
+            print("Failed to initialize schema.")
+            sys.exit(1)
+        
+        # Ask about migration
+        if os.path.exists('linkedin_contacts.db'):
+            migrate = input("\nSQLite database found. Migrate existing data? (y/n): ").lower().strip()
+            if migrate == 'y':
+                print("\nMigrating data from SQLite...")
+                migrate_from_sqlite(conn)
+    finally:
+        conn.close()
     
     print("\n✅ Database initialization complete!")
     print("\nTo use this database URL in your webhook listener:")
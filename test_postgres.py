@@ -5,115 +5,299 @@ Test PostgreSQL connection and basic operations
 
 import os
 import sys
-import json
+import io
+import logging
+from logging.handlers import MemoryHandler
+import uuid
+import orjson
+from psycopg2 import sql
+from psycopg2.extras import execute_values
 from datetime import datetime
 from db_config import db_config, test_database_connection
 
+# Progress from the database checks is buffered and written once when they
+# finish, so stdout writes don't land between the timed statements; an error
+# flushes the buffer immediately
+_stdout_handler = logging.StreamHandler(sys.stdout)
+_log_buffer = MemoryHandler(capacity=1024, flushLevel=logging.ERROR, target=_stdout_handler)
+log = logging.getLogger('test_postgres')
+log.addHandler(_log_buffer)
+log.setLevel(logging.INFO)
+log.propagate = False
+
+try:
+    import simdjson
+except ImportError:  # pysimdjson is optional; orjson decodes the read-back without it
+    simdjson = None
+
+# Test rows go to UNLOGGED copies of the tables in a throwaway schema, found
+# first on the search_path; dropping the schema replaces per-row DELETEs.
+# LIKE ... INCLUDING ALL copies the nextval() defaults of public's sequences,
+# which a DROP would not give back, so the ids get their own identity instead.
+# The log/contact insert is prepared in the same round trip, after the
+# search_path change so it resolves to the test tables; the test then runs
+# it with EXECUTE instead of having the server parse and plan it again.
+CREATE_TEST_SCHEMA_SQL = sql.SQL("""
+    CREATE SCHEMA {schema};
+    CREATE UNLOGGED TABLE {schema}.linkedin_contacts (LIKE public.linkedin_contacts INCLUDING ALL);
+    CREATE UNLOGGED TABLE {schema}.webhook_logs (LIKE public.webhook_logs INCLUDING ALL);
+    ALTER TABLE {schema}.linkedin_contacts
+        ALTER id DROP DEFAULT, ALTER id ADD GENERATED BY DEFAULT AS IDENTITY;
+    ALTER TABLE {schema}.webhook_logs
+        ALTER log_id DROP DEFAULT, ALTER log_id ADD GENERATED BY DEFAULT AS IDENTITY;
+    SET search_path TO {schema}, public;
+    
+    PREPARE ins_log_contact (text, text, jsonb, text, text, text, text, text, text) AS
+    WITH log AS (
+        INSERT INTO webhook_logs (event_type, contact_email, webhook_data)
+        VALUES ($1, $2, $3)
+        RETURNING log_id, webhook_data
+    )
+    INSERT INTO linkedin_contacts 
+    (name, title, company, location, email, linkedin_url, website, raw_json)
+    SELECT $4, $5, $6, $7, $2, $8, $9, webhook_data
+    FROM log
+    ON CONFLICT (email) DO UPDATE SET
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING (SELECT log_id FROM log), id, (xmax = 0) AS inserted;
+""")
+
+# DEALLOCATE ALL also covers a setup that failed before PREPARE ran; db_config
+# connections hold no other prepared statements
+DROP_TEST_SCHEMA_SQL = sql.SQL("""
+    DROP SCHEMA IF EXISTS {schema} CASCADE;
+    RESET search_path;
+    DEALLOCATE ALL;
+""")
+
+# In one round trip: the planner's estimate for the real contacts table (O(1)
+# where COUNT(*) scans it), then exact counts and the stored payload from this
+# run's test tables (unqualified names resolve to the test schema)
+RETRIEVAL_SQL = """
+    SELECT
+        (SELECT GREATEST(reltuples, 0)::bigint FROM pg_class
+         WHERE oid = 'public.linkedin_contacts'::regclass),
+        (SELECT COUNT(*) FROM linkedin_contacts),
+        (SELECT COUNT(*) FROM webhook_logs 
+         WHERE received_at > CURRENT_TIMESTAMP - INTERVAL '1 hour'),
+        (SELECT webhook_data::text FROM webhook_logs
+         ORDER BY log_id DESC LIMIT 1)
+"""
+
+def payload_email(webhook_data):
+    """The email field of a stored webhook payload (JSON text)"""
+    if simdjson is not None:
+        # Reads the one field without building the whole document as Python objects
+        return simdjson.Parser().parse(webhook_data.encode()).at_pointer('/email')
+    return orjson.loads(webhook_data)['email']
+
+TEST_DATA = {
+    "name": "Test User",
+    "email": "test@example.com",
+    "title": "Software Engineer",
+    "company": "Test Company",
+    "location": "San Francisco, CA",
+    "linkedin_url": "https://linkedin.com/in/testuser",
+    "website": "https://example.com"
+}
+# Serialized once at import and bound to every JSONB column. Bound as text:
+# bytes would be sent as bytea, which doesn't cast to jsonb.
+TEST_DATA_JSON = orjson.dumps(TEST_DATA).decode()
+
+# Opens the insert transaction: test rows are throwaway, so its commit doesn't
+# wait on a WAL flush. Sent as one statement string, fixed at import, so the
+# setting costs no round trip of its own; the EXECUTE's row is what's fetched.
+EXECUTE_LOG_AND_CONTACT_SQL = """
+    SET LOCAL synchronous_commit = off;
+    EXECUTE ins_log_contact (
+        %(event_type)s, %(email)s, %(payload)s, %(name)s, %(title)s,
+        %(company)s, %(location)s, %(linkedin_url)s, %(website)s
+    )
+"""
+
+# The batch insert test bulk loads one batch below COPY_THRESHOLD
+# (execute_values) and one above it (COPY), so both paths are exercised
+SMALL_BATCH_TEST_SIZE = 10
+BATCH_TEST_SIZE = 100
+
+BATCH_INSERT_SQL = """
+    INSERT INTO linkedin_contacts 
+    (name, title, company, location, email, linkedin_url, website, raw_json)
+    VALUES %s
+    ON CONFLICT (email) DO UPDATE SET
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING id
+"""
+
+# Batches at least this large are loaded with COPY instead of a multi-row INSERT
+COPY_THRESHOLD = 50
+
+CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE tmp_contacts (
+        name TEXT, title TEXT, company TEXT, location TEXT, email TEXT,
+        linkedin_url TEXT, website TEXT, raw_json JSONB
+    ) ON COMMIT DROP
+"""
+
+# In CSV, only an unquoted empty field is NULL; a quoted "" is an empty string
+COPY_STAGING_SQL = "COPY tmp_contacts FROM STDIN WITH (FORMAT CSV)"
+
+# Both bulk paths must store '' as '' and None as NULL
+BULK_VALUES_CHECK_SQL = """
+    SELECT COUNT(*) FROM linkedin_contacts
+    WHERE email = ANY(%s) AND location = '' AND website IS NULL
+"""
+
+UPSERT_FROM_STAGING_SQL = """
+    INSERT INTO linkedin_contacts 
+    (name, title, company, location, email, linkedin_url, website, raw_json)
+    SELECT name, title, company, location, email, linkedin_url, website, raw_json
+    FROM tmp_contacts
+    ON CONFLICT (email) DO UPDATE SET
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING id
+"""
+
+def csv_line(row):
+    """One CSV record for COPY: None as an unquoted empty field (NULL), every
+    other value quoted, so empty strings stay empty strings"""
+    return ','.join(
+        '' if value is None else '"' + str(value).replace('"', '""') + '"'
+        for value in row
+    ) + '\n'
+
+def bulk_upsert_contacts(cursor, rows):
+    """Upsert contact rows and return their ids; large batches go through COPY
+    into a temp table that is dropped at commit."""
+    if len(rows) < COPY_THRESHOLD:
+        return execute_values(cursor, BATCH_INSERT_SQL, rows, page_size=len(rows), fetch=True)
+    
+    buffer = io.StringIO(''.join(csv_line(row) for row in rows))
+    
+    cursor.execute(CREATE_STAGING_SQL)
+    cursor.copy_expert(COPY_STAGING_SQL, buffer)
+    cursor.execute(UPSERT_FROM_STAGING_SQL)
+    return cursor.fetchall()
+
 def test_webhook_operations():
     """Test webhook database operations"""
+    try:
+        return run_webhook_operations()
+    finally:
+        _log_buffer.flush()
+
+def run_webhook_operations():
+    """Run the webhook database checks, logging progress to the buffered logger"""
     
-    print("\n=== Testing Webhook Database Operations ===\n")
+    log.info("\n=== Testing Webhook Database Operations ===\n")
     
     # Test connection
-    print("1. Testing database connection...")
+    log.info("1. Testing database connection...")
     if not test_database_connection():
-        print("❌ Database connection failed")
+        log.error("❌ Database connection failed")
         return False
-    print("✅ Database connection successful")
+    log.info("✅ Database connection successful")
     
     # Test data insertion
-    print("\n2. Testing data insertion...")
-    test_data = {
-        "name": "Test User",
-        "email": "test@example.com",
-        "title": "Software Engineer",
-        "company": "Test Company",
-        "location": "San Francisco, CA",
-        "linkedin_url": "https://linkedin.com/in/testuser",
-        "website": "https://example.com"
-    }
+    log.info("\n2. Testing data insertion...")
+    test_data = TEST_DATA
+    payload = TEST_DATA_JSON
+    
+    batch_emails = [f"batch-test-{i}@example.com" for i in range(SMALL_BATCH_TEST_SIZE + BATCH_TEST_SIZE)]
+    schema = sql.Identifier(f"test_run_{uuid.uuid4().hex[:12]}")
+    
+    # One pooled connection serves insertion, retrieval and cleanup
+    conn = db_config.get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CREATE_TEST_SCHEMA_SQL.format(schema=schema))
+        conn.commit()
+        passed = insert_test_data(conn, cursor, test_data, payload, batch_emails) and \
+            retrieve_test_data(conn, cursor, 1 + len(batch_emails))
+    except Exception as e:
+        log.error(f"❌ Test schema setup failed: {e}")
+        passed = False
+    finally:
+        # Test cleanup - drop the schema and every test row with it
+        conn.rollback()
+        cursor.execute(DROP_TEST_SCHEMA_SQL.format(schema=schema))
+        conn.commit()
+        log.info("✅ Test data cleaned up")
+        cursor.close()
+        db_config.return_connection(conn)
     
+    if passed:
+        log.info("\n✅ All tests passed!")
+    return passed
+
+def insert_test_data(conn, cursor, test_data, payload, batch_emails):
+    """Insert the test log, contact and contact batch; returns False on failure"""
     try:
-        conn = db_config.get_connection()
-        cursor = conn.cursor()
+        # Insert test webhook log and contact in one statement; the payload is
+        # sent once and the contact's raw_json reuses the log's parsed JSONB
+        cursor.execute(EXECUTE_LOG_AND_CONTACT_SQL, dict(test_data, event_type='test_event', payload=payload))
         
-        # Insert test webhook log
-        cursor.execute("""
-            INSERT INTO webhook_logs (event_type, contact_email, webhook_data)
-            VALUES (%s, %s, %s)
-            RETURNING log_id
-        """, ('test_event', test_data['email'], json.dumps(test_data)))
+        log_id, contact_id, was_inserted = cursor.fetchone()
+        log.info(f"✅ Created webhook log with ID: {log_id}")
+        action = "created" if was_inserted else "updated"
+        log.info(f"✅ Contact {action} with ID: {contact_id}")
         
-        log_id = cursor.fetchone()[0]
-        print(f"✅ Created webhook log with ID: {log_id}")
+        # Bulk load a small batch (execute_values) and a large one (COPY); an
+        # empty location and missing website check both store the same values
+        rows = [
+            (test_data['name'], test_data['title'], test_data['company'], '',
+             email, test_data['linkedin_url'], None, payload)
+            for email in batch_emails
+        ]
+        for batch in (rows[:SMALL_BATCH_TEST_SIZE], rows[SMALL_BATCH_TEST_SIZE:]):
+            batch_ids = bulk_upsert_contacts(cursor, batch)
+            if len(batch_ids) != len(batch):
+                raise AssertionError(f"expected {len(batch)} batch rows, got {len(batch_ids)}")
+            path = "execute_values" if len(batch) < COPY_THRESHOLD else "COPY"
+            log.info(f"✅ Bulk loaded {len(batch_ids)} contacts via {path}")
         
-        # Insert test contact
-        cursor.execute("""
-            INSERT INTO linkedin_contacts 
-            (name, title, company, location, email, linkedin_url, website, raw_json)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (email) DO UPDATE SET
-                updated_at = CURRENT_TIMESTAMP
-            RETURNING id, (xmax = 0) AS inserted
-        """, (
-            test_data['name'],
-            test_data['title'],
-            test_data['company'],
-            test_data['location'],
-            test_data['email'],
-            test_data['linkedin_url'],
-            test_data['website'],
-            json.dumps(test_data)
-        ))
-        
-        contact_id, was_inserted = cursor.fetchone()
-        action = "created" if was_inserted else "updated"
-        print(f"✅ Contact {action} with ID: {contact_id}")
+        cursor.execute(BULK_VALUES_CHECK_SQL, (batch_emails,))
+        matching = cursor.fetchone()[0]
+        if matching != len(rows):
+            raise AssertionError(f"expected {len(rows)} bulk rows with '' location and NULL website, got {matching}")
+        log.info("✅ Both bulk paths stored empty strings and NULLs alike")
         
         conn.commit()
         
     except Exception as e:
-        print(f"❌ Data insertion failed: {e}")
+        log.error(f"❌ Data insertion failed: {e}")
         conn.rollback()
         return False
-    finally:
-        cursor.close()
-        db_config.return_connection(conn)
-    
-    # Test data retrieval
-    print("\n3. Testing data retrieval...")
+    return True
+
+def retrieve_test_data(conn, cursor, expected_contacts):
+    """Read back counts from the test tables; returns False on failure"""
+    log.info("\n3. Testing data retrieval...")
     try:
-        conn = db_config.get_connection()
-        cursor = conn.cursor()
+        # Count contacts and recent logs, and fetch the stored payload
+        cursor.execute(RETRIEVAL_SQL)
+        estimated_contacts, test_contacts, recent_logs, webhook_data = cursor.fetchone()
+        log.info(f"✅ Database holds about {estimated_contacts} contacts (planner estimate)")
         
-        # Count contacts
-        cursor.execute("SELECT COUNT(*) FROM linkedin_contacts")
-        count = cursor.fetchone()[0]
-        print(f"✅ Found {count} contacts in database")
+        if test_contacts != expected_contacts or recent_logs != 1:
+            raise AssertionError(
+                f"expected {expected_contacts} contacts and 1 recent log in test tables, "
+                f"got {test_contacts} and {recent_logs}"
+            )
+        log.info(f"✅ Test tables hold {test_contacts} contacts and {recent_logs} recent webhook log")
         
-        # Get recent logs
-        cursor.execute("""
-            SELECT COUNT(*) FROM webhook_logs 
-            WHERE received_at > CURRENT_TIMESTAMP - INTERVAL '1 hour'
-        """)
-        recent_logs = cursor.fetchone()[0]
-        print(f"✅ Found {recent_logs} recent webhook logs")
-        
-        # Test cleanup - remove test data
-        cursor.execute("DELETE FROM linkedin_contacts WHERE email = %s", (test_data['email'],))
-        cursor.execute("DELETE FROM webhook_logs WHERE contact_email = %s", (test_data['email'],))
+        # Decode the stored payload to check it round-tripped
+        email = payload_email(webhook_data)
+        if email != TEST_DATA['email']:
+            raise AssertionError(f"stored payload has email {email!r}")
+        log.info("✅ Stored webhook payload read back intact")
         
         conn.commit()
-        print("✅ Test data cleaned up")
         
     except Exception as e:
-        print(f"❌ Data retrieval failed: {e}")
+        log.error(f"❌ Data retrieval failed: {e}")
+        conn.rollback()
         return False
-    finally:
-        cursor.close()
-        db_config.return_connection(conn)
-    
-    print("\n✅ All tests passed!")
     return True
 
 def show_connection_info():
@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 """
 Simple script to test the webhook endpoint
+
+Usage: python test_webhook.py [count]
+With a count above 1, that many webhooks are sent concurrently as a quick load test.
 """
 import requests
-import json
+from requests.adapters import HTTPAdapter
+import orjson
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Replace with your actual Render URL
 WEBHOOK_URL = "https://webhook-listener-6qvy.onrender.com/webhook"
 
+# Requests in flight at once in load-test mode
+MAX_CONCURRENCY = 16
+
 # Test data
 test_data = {
     "event": "test",
@@ -19,18 +29,41 @@ test_data = {
     }
 }
 
+# Encoded once; every request sends the same bytes instead of re-encoding json=
+TEST_BODY = orjson.dumps(test_data)
+
+# One keep-alive session for every request, so only the first request per
+# pooled connection pays for the TCP/TLS handshake
+SESSION = requests.Session()
+SESSION.headers.update({"Content-Type": "application/json"})
+SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENCY))
+
+def send_webhook(body):
+    """POST one webhook body and return the response"""
+    return SESSION.post(WEBHOOK_URL, data=body)
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+
 print(f"Sending test webhook to: {WEBHOOK_URL}")
-print(f"Data: {json.dumps(test_data, indent=2)}")
+print(f"Data: {orjson.dumps(test_data, option=orjson.OPT_INDENT_2).decode()}")
 
 try:
-    response = requests.post(
-        WEBHOOK_URL,
-        json=test_data,
-        headers={"Content-Type": "application/json"}
-    )
-    
-    print(f"\nResponse Status: {response.status_code}")
-    print(f"Response Body: {response.text}")
+    if count == 1:
+        response = send_webhook(TEST_BODY)
+        
+        print(f"\nResponse Status: {response.status_code}")
+        print(f"Response Body: {response.text}")
+    else:
+        # Threads overlap the network round trips, so wall time is roughly
+        # count / MAX_CONCURRENCY round trips instead of count
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(count, MAX_CONCURRENCY)) as executor:
+            statuses = [response.status_code for response in executor.map(send_webhook, [TEST_BODY] * count)]
+        elapsed = time.perf_counter() - start
+        
+        # app_postgres answers 201 (created) or 202 (skipped), app.py 200
+        ok = sum(1 for status in statuses if 200 <= status < 300)
+        print(f"\nSent {count} webhooks in {elapsed:.2f}s ({count / elapsed:.1f}/s), {ok} succeeded (2xx)")
     
 except Exception as e:
     print(f"\nError: {e}")
\ No newline at end of file